@@ -1,14 +1,197 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import functools
 import os
+import sqlite3
 import time
+from pathlib import Path
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 import json
 
 import aiosqlite
 
-
-@dataclass(frozen=True)
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _json_loads(raw: str | bytes):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(value) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, ensure_ascii=False)
+
+
+# Hot-path statements live at module level so every call passes the same SQL text and
+# hits sqlite3's per-connection statement cache instead of re-preparing.
+_SQL_GET_PANEL_BY_ID = """
+SELECT id, owner_user_id, name, base_url, admin_username, admin_password_enc,
+       verify_ssl, default_chat_id, created_at, updated_at
+FROM panels
+WHERE id=?
+"""
+
+_SQL_GET_TELEGRAM_CONFIG = "SELECT bot_token, admin_user_ids, webhook_url, updated_at FROM telegram_config WHERE id=1"
+
+_SQL_SET_KV = """
+INSERT INTO kv(key, value, updated_at)
+VALUES(?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET
+  value=excluded.value,
+  updated_at=excluded.updated_at
+"""
+
+_SQL_GET_KV = "SELECT value FROM kv WHERE key=?"
+
+_SQL_GET_BINDING = "SELECT panel_id, username, chat_id, user_id, updated_at FROM bindings WHERE panel_id=? AND username=?"
+
+_SQL_GET_SCHEDULE = """
+SELECT panel_id, username, interval_minutes, next_run_at, enabled, last_run_at, last_error
+FROM schedules
+WHERE panel_id=? AND username=?
+"""
+
+_SQL_SET_SCHEDULE = """
+INSERT INTO schedules(panel_id, username, interval_hours, interval_minutes, next_run_at, enabled)
+VALUES(?, ?, ?, ?, ?, ?)
+ON CONFLICT(panel_id, username) DO UPDATE SET
+  interval_hours=excluded.interval_hours,
+  interval_minutes=excluded.interval_minutes,
+  next_run_at=excluded.next_run_at,
+  enabled=excluded.enabled
+"""
+
+_SQL_GET_DUE_SCHEDULES = """
+SELECT panel_id, username, interval_minutes, next_run_at, enabled, last_run_at, last_error
+FROM schedules
+WHERE enabled=1 AND next_run_at <= ?
+ORDER BY next_run_at ASC
+"""
+
+_SQL_MARK_SCHEDULE_RESULT = """
+UPDATE schedules
+SET next_run_at=?, last_run_at=?, last_error=?
+WHERE panel_id=? AND username=?
+"""
+
+_SQL_GET_SCHEDULE_CONFIG = """
+SELECT panel_id, username, message_template, selected_link_keys, button_templates, updated_at, keys_migrated_at
+FROM schedule_configs
+WHERE panel_id=? AND username=?
+"""
+
+
+_SQL_GET_SCHEDULE_MESSAGE_STATE = """
+SELECT panel_id, username, chat_id, message_ids, message_texts, updated_at
+FROM schedule_message_states
+WHERE panel_id=? AND username=?
+"""
+
+_SQL_SET_SCHEDULE_MESSAGE_STATE = """
+INSERT INTO schedule_message_states(panel_id, username, chat_id, message_ids, message_texts, updated_at)
+VALUES(?, ?, ?, ?, ?, ?)
+ON CONFLICT(panel_id, username) DO UPDATE SET
+  chat_id=excluded.chat_id,
+  message_ids=excluded.message_ids,
+  message_texts=excluded.message_texts,
+  updated_at=excluded.updated_at
+"""
+
+# Everything the scheduler reads per due row except panels, which are served from the
+# read-through cache. Column order is Schedule + ScheduleConfig + ScheduleMessageState + Binding.
+# Every joined table is keyed by (panel_id, username) like schedules, so each due schedule
+# appears exactly once and a tick can never send the same schedule twice.
+_SQL_GET_DUE_SCHEDULE_BUNDLES = """
+SELECT s.panel_id, s.username, s.interval_minutes, s.next_run_at, s.enabled, s.last_run_at, s.last_error,
+       c.panel_id, c.username, c.message_template, c.selected_link_keys, c.button_templates,
+       c.updated_at, c.keys_migrated_at,
+       m.panel_id, m.username, m.chat_id, m.message_ids, m.message_texts, m.updated_at,
+       b.panel_id, b.username, b.chat_id, b.user_id, b.updated_at
+FROM schedules s
+LEFT JOIN schedule_configs c ON c.panel_id=s.panel_id AND c.username=s.username
+LEFT JOIN schedule_message_states m ON m.panel_id=s.panel_id AND m.username=s.username
+LEFT JOIN bindings b ON b.panel_id=s.panel_id AND b.username=s.username
+WHERE s.enabled=1 AND s.next_run_at <= ?
+ORDER BY s.next_run_at ASC
+LIMIT ?
+"""
+
+
+_READER_POOL_SIZE = 4
+# INSERT ... RETURNING needs SQLite 3.35+; older builds fall back to lastrowid.
+_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+_CACHE_MAX_ENTRIES = 1024
+_CACHE_TTL_SECONDS = 30
+_MAX_IDLE_SLEEP_SECONDS = 300
+_MISSING = object()
+# Marker of the transaction() block the current task (and tasks it spawns) runs inside.
+_TX_MARKER: contextvars.ContextVar[object | None] = contextvars.ContextVar("marzban_db_tx", default=None)
+
+
+def _now() -> int:
+    # Integer epoch seconds without the float round-trip of int(time.time()).
+    return time.time_ns() // 1_000_000_000
+
+
+def _message_state_row(
+    panel_id: int, username: str, chat_id: int, message_ids: list[int], message_texts: list[str], now: int
+) -> tuple[int, str, int, str, str, int]:
+    ids_json = _json_dumps([int(x) for x in (message_ids or [])])
+    texts_json = _json_dumps([str(x or "") for x in (message_texts or [])])
+    return (int(panel_id), username, int(chat_id), ids_json, texts_json, now)
+
+
+def _cache_get(cache: dict, key: object) -> object:
+    entry = cache.get(key)
+    if entry is None:
+        return _MISSING
+    if entry[0] < time.monotonic():
+        cache.pop(key, None)
+        return _MISSING
+    return entry[1]
+
+
+def _cache_put(cache: dict, key: object, value: object) -> None:
+    if len(cache) >= _CACHE_MAX_ENTRIES and key not in cache:
+        cache.pop(next(iter(cache)))
+    cache[key] = (time.monotonic() + _CACHE_TTL_SECONDS, value)
+
+
+# schedule_configs JSON columns are re-read on every scheduler run but rarely change, so
+# parsing is memoized on the raw column text (which doubles as the cache key/version).
+@functools.lru_cache(maxsize=1024)
+def _decode_link_keys(raw: str) -> tuple[str, ...]:
+    try:
+        parsed = _json_loads(raw)
+    except Exception:
+        return ()
+    if not isinstance(parsed, list):
+        return ()
+    return tuple(str(x) for x in parsed if str(x).strip())
+
+
+@functools.lru_cache(maxsize=1024)
+def _decode_button_templates(raw: str) -> tuple[str, ...]:
+    try:
+        parsed = _json_loads(raw)
+    except Exception:
+        return ()
+    if not isinstance(parsed, list):
+        return ()
+    return tuple(str(x or "").strip() for x in parsed)
+
+
+@dataclass(frozen=True, slots=True)
 class AppUser:
     id: int
     username: str
@@ -16,7 +199,7 @@ class AppUser:
     created_at: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Panel:
     id: int
     owner_user_id: int
@@ -30,7 +213,7 @@ class Panel:
     updated_at: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TelegramConfig:
     bot_token: str | None
     admin_user_ids: str | None
@@ -38,7 +221,7 @@ class TelegramConfig:
     updated_at: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Binding:
     panel_id: int
     username: str
@@ -46,8 +229,18 @@ class Binding:
     user_id: int | None
     updated_at: int
 
+    @classmethod
+    def _from_row(cls, row: tuple) -> Binding:
+        return cls(
+            panel_id=int(row[0]),
+            username=str(row[1]),
+            chat_id=int(row[2]),
+            user_id=None if row[3] is None else int(row[3]),
+            updated_at=int(row[4]),
+        )
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Schedule:
     panel_id: int
     username: str
@@ -57,8 +250,22 @@ class Schedule:
     last_run_at: int | None
     last_error: str | None
 
-
-@dataclass(frozen=True)
+    @classmethod
+    def _from_row(cls, row: tuple) -> Schedule:
+        # Skips the generated frozen __init__ for list queries that build thousands of rows.
+        inst = cls.__new__(cls)
+        osa = object.__setattr__
+        osa(inst, "panel_id", row[0])
+        osa(inst, "username", row[1])
+        osa(inst, "interval_minutes", row[2])
+        osa(inst, "next_run_at", row[3])
+        osa(inst, "enabled", bool(row[4]))
+        osa(inst, "last_run_at", row[5])
+        osa(inst, "last_error", row[6])
+        return inst
+
+
+@dataclass(frozen=True, slots=True)
 class ScheduleConfig:
     panel_id: int
     username: str
@@ -66,9 +273,26 @@ class ScheduleConfig:
     selected_link_keys: list[str]
     button_templates: list[str]
     updated_at: int
+    # Set once selected_link_keys are known to be stable keys; the scheduler then skips the
+    # pre-revoke user/subscription fetch it needs to remap older key formats.
+    keys_migrated_at: int | None = None
+
+    @classmethod
+    def _from_row(cls, row: tuple) -> ScheduleConfig:
+        selected_raw = row[3]
+        buttons_raw = row[4]
+        return cls(
+            panel_id=int(row[0]),
+            username=str(row[1]),
+            message_template=None if row[2] is None else str(row[2]),
+            selected_link_keys=list(_decode_link_keys(str(selected_raw))) if selected_raw else [],
+            button_templates=list(_decode_button_templates(str(buttons_raw))) if buttons_raw else [],
+            updated_at=int(row[5]),
+            keys_migrated_at=None if row[6] is None else int(row[6]),
+        )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ScheduleMessageState:
     panel_id: int
     username: str
@@ -77,22 +301,106 @@ class ScheduleMessageState:
     message_texts: list[str]
     updated_at: int
 
+    @classmethod
+    def _from_row(cls, row: tuple) -> ScheduleMessageState:
+        message_ids: list[int] = []
+        try:
+            parsed = _json_loads(row[3] or "[]")
+            if isinstance(parsed, list):
+                message_ids = [int(x) for x in parsed if isinstance(x, int) or str(x).isdigit()]
+        except Exception:
+            message_ids = []
+
+        message_texts: list[str] = []
+        try:
+            parsed = _json_loads(row[4] or "[]")
+            if isinstance(parsed, list):
+                message_texts = [str(x or "") for x in parsed]
+        except Exception:
+            message_texts = []
+
+        return cls(
+            panel_id=int(row[0]),
+            username=str(row[1]),
+            chat_id=int(row[2]),
+            message_ids=message_ids,
+            message_texts=message_texts,
+            updated_at=int(row[5]),
+        )
+
 
 class Database:
     def __init__(self, path: str) -> None:
         self._path = path
         self._conn: aiosqlite.Connection | None = None
+        # WAL lets readers run alongside the single writer, so SELECT-only helpers use a
+        # small pool of read-only connections instead of queueing behind writes.
+        self._readers: list[aiosqlite.Connection] = []
+        self._reader_idx = 0
+        # One writer at a time: transaction() holds this for its whole block, and mutators
+        # outside it take it per statement so they never land in another task's transaction.
+        self._write_lock = asyncio.Lock()
+        self._tx_marker: object | None = None
+        self._pending_commit: asyncio.Future[None] | None = None
+        # Read-through caches for rows looked up on every scheduler run / Telegram update.
+        # This process is the only writer, so the mutators below keep them coherent; entries
+        # also expire after _CACHE_TTL_SECONDS. Every invalidation bumps _cache_gen, and a read
+        # only fills the cache if the generation is unchanged since it started, so a query
+        # that raced a write cannot store the old row.
+        self._panel_cache: dict[int, tuple[float, Panel | None]] = {}
+        self._binding_cache: dict[tuple[int, str], tuple[float, Binding | None]] = {}
+        self._telegram_config_cache: dict[int, tuple[float, TelegramConfig]] = {}
+        self._cache_gen = 0
+        self._schedules_version = 0
 
     async def connect(self) -> None:
         os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
-        self._conn = await aiosqlite.connect(self._path)
+        self._conn = await aiosqlite.connect(self._path, iter_chunk_size=256, cached_statements=256)
         self._conn.row_factory = aiosqlite.Row
-        await self._conn.execute("PRAGMA journal_mode=WAL;")
-        await self._conn.execute("PRAGMA foreign_keys=ON;")
+        # auto_vacuum only takes effect on a database without tables; on existing files it is a no-op.
+        await self._conn.executescript(
+            """
+            PRAGMA auto_vacuum=INCREMENTAL;
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-64000;
+            PRAGMA mmap_size=268435456;
+            PRAGMA wal_autocheckpoint=1000;
+            PRAGMA busy_timeout=5000;
+            PRAGMA foreign_keys=ON;
+            """
+        )
         await self._init_schema()
 
+        ro_uri = f"{Path(self._path).resolve().as_uri()}?mode=ro"
+        for _ in range(_READER_POOL_SIZE):
+            reader = await aiosqlite.connect(ro_uri, uri=True, iter_chunk_size=256, cached_statements=256)
+            reader.row_factory = aiosqlite.Row
+            await reader.executescript(
+                """
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-16000;
+                PRAGMA mmap_size=268435456;
+                PRAGMA busy_timeout=5000;
+                """
+            )
+            self._readers.append(reader)
+
     async def aclose(self) -> None:
+        if self._pending_commit is not None:
+            await self._pending_commit
+        readers, self._readers = self._readers, []
+        for reader in readers:
+            try:
+                await reader.close()
+            except Exception:
+                pass
         if self._conn is not None:
+            try:
+                await self._conn.execute("PRAGMA optimize")
+            except Exception:
+                pass
             await self._conn.close()
             self._conn = None
 
@@ -102,7 +410,141 @@ class Database:
             raise RuntimeError("Database is not connected")
         return self._conn
 
+    async def optimize(self) -> None:
+        """Refresh stale planner statistics; cheap enough to run hourly."""
+        async with self._writing():
+            await self.conn.execute("PRAGMA optimize")
+
+    async def maintenance(self) -> None:
+        """Return free pages to the OS and truncate the WAL; meant for a periodic task."""
+        # executescript would COMMIT first, so this runs plain statements under the writer
+        # lock instead, after any pending group commit and never inside a transaction().
+        if self._in_own_tx():
+            raise RuntimeError("maintenance() cannot run inside transaction()")
+        async with self._write_lock:
+            if self._pending_commit is not None:
+                await asyncio.shield(self._pending_commit)
+            # sqlite3 steps a PRAGMA once per execute and incremental_vacuum frees one page
+            # per step, so loop over (at most 200 of) the free pages.
+            async with self.conn.execute("PRAGMA freelist_count") as cur:
+                row = await cur.fetchone()
+            for _ in range(min(int(row[0]) if row else 0, 200)):
+                async with self.conn.execute("PRAGMA incremental_vacuum"):
+                    pass
+            async with self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cur:
+                await cur.fetchall()
+
+    def _reader(self) -> aiosqlite.Connection:
+        readers = self._readers
+        if not readers:
+            return self.conn
+        self._reader_idx = (self._reader_idx + 1) % len(readers)
+        return readers[self._reader_idx]
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        # Mutators called inside the block skip their own commit, so N writes cost one fsync.
+        # Other tasks' writes wait on the writer lock until the block commits or rolls back.
+        if self._in_own_tx():
+            yield
+            return
+        async with self._write_lock:
+            if self._pending_commit is not None:
+                await asyncio.shield(self._pending_commit)
+            await self.conn.execute("BEGIN IMMEDIATE")
+            marker = object()
+            self._tx_marker = marker
+            token = _TX_MARKER.set(marker)
+            try:
+                yield
+            except BaseException:
+                await self.conn.rollback()
+                raise
+            else:
+                await self.conn.commit()
+            finally:
+                _TX_MARKER.reset(token)
+                self._tx_marker = None
+                self._invalidate_caches()
+
+    def _in_own_tx(self) -> bool:
+        marker = self._tx_marker
+        return marker is not None and _TX_MARKER.get() is marker
+
+    @asynccontextmanager
+    async def _writing(self) -> AsyncIterator[None]:
+        # Runs the block's statements under the writer lock, then group-commits them. Inside
+        # this task's own transaction() the lock is already held and the block commits later.
+        if self._in_own_tx():
+            yield
+            return
+        async with self._write_lock:
+            yield
+        await self._commit()
+
+    def _invalidate_caches(self) -> None:
+        self._cache_gen += 1
+        self._panel_cache.clear()
+        self._binding_cache.clear()
+        self._telegram_config_cache.clear()
+        self._schedules_version += 1
+
+    def _forget(self, cache: dict, key: object = _MISSING) -> None:
+        self._cache_gen += 1
+        if key is _MISSING:
+            cache.clear()
+        else:
+            cache.pop(key, None)
+
+    @property
+    def schedules_version(self) -> int:
+        """Bumped whenever this process changes schedules; lets pollers skip idle DB reads."""
+        return self._schedules_version
+
+    async def _commit(self) -> None:
+        if self._in_own_tx():
+            return
+        # aiosqlite already serializes every call onto one worker thread; what remains is
+        # one COMMIT (fsync) per write. Writers that finish their statement in the same
+        # event-loop turn share a single group commit instead. _writing() registers the
+        # commit before yielding, so a transaction() taking the lock next waits for it.
+        pending = self._pending_commit
+        if pending is None:
+            pending = asyncio.ensure_future(self._group_commit())
+            self._pending_commit = pending
+        await asyncio.shield(pending)
+
+    async def _group_commit(self) -> None:
+        await asyncio.sleep(0)
+        # Writers arriving after this point queue their statements behind this COMMIT,
+        # so they must start a new group.
+        self._pending_commit = None
+        await self.conn.commit()
+
+    async def _iter_tuples(self, sql: str, params: tuple = ()) -> AsyncIterator[tuple]:
+        # Plain tuples skip aiosqlite.Row construction on list queries; callers index by
+        # position, so the SELECT column order must match the dataclass field order.
+        async with self._reader().execute(sql, params) as cur:
+            cur.row_factory = None
+            async for row in cur:
+                yield row
+
     async def _init_schema(self) -> None:
+        # PRAGMA user_version records the last applied step, so an up-to-date database
+        # skips the table_info/sqlite_master probes below with a single PRAGMA read.
+        cur = await self.conn.execute("PRAGMA user_version")
+        row = await cur.fetchone()
+        version = int(row[0]) if row else 0
+        migrations = ((1, self._migrate_v1), (2, self._migrate_v2))
+        for target, migrate in migrations:
+            if version >= target:
+                continue
+            await migrate()
+            await self.conn.execute(f"PRAGMA user_version={int(target)}")
+            await self._commit()
+
+    async def _migrate_v1(self) -> None:
+        # Idempotent bootstrap: also upgrades databases created before user_version was tracked.
         await self.conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS kv (
@@ -116,6 +558,7 @@ class Database:
         await self._maybe_rename_legacy_table("bindings", expected_cols={"panel_id"})
         await self._maybe_rename_legacy_table("schedules", expected_cols={"panel_id"})
 
+        needs_analyze = not await self._index_exists("idx_schedules_due")
         await self.conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS app_users (
@@ -191,26 +634,40 @@ class Database:
               PRIMARY KEY(panel_id, username),
               FOREIGN KEY(panel_id) REFERENCES panels(id) ON DELETE CASCADE
             );
+
+            CREATE INDEX IF NOT EXISTS idx_schedules_due ON schedules(enabled, next_run_at);
+            CREATE INDEX IF NOT EXISTS idx_panels_owner ON panels(owner_user_id);
             """
         )
-        await self.conn.commit()
+        await self._commit()
+        if needs_analyze:
+            # Give the planner stats for the new indexes once.
+            await self.conn.execute("ANALYZE")
+            await self._commit()
 
         await self._ensure_interval_minutes()
         await self._ensure_schedule_config_button_templates()
 
+    async def _migrate_v2(self) -> None:
+        cols = await self._table_columns("schedule_configs")
+        if "keys_migrated_at" not in cols:
+            await self.conn.execute("ALTER TABLE schedule_configs ADD COLUMN keys_migrated_at INTEGER;")
+            await self._commit()
+
     async def _ensure_interval_minutes(self) -> None:
         if not await self._table_exists("schedules"):
             return
         cols = await self._table_columns("schedules")
+        # Reads select interval_minutes directly (no COALESCE), so the backfill must leave no NULLs.
         if "interval_minutes" in cols:
             await self.conn.execute(
                 "UPDATE schedules SET interval_minutes = interval_hours * 60 WHERE interval_minutes IS NULL"
             )
-            await self.conn.commit()
+            await self._commit()
             return
         await self.conn.execute("ALTER TABLE schedules ADD COLUMN interval_minutes INTEGER;")
         await self.conn.execute("UPDATE schedules SET interval_minutes = interval_hours * 60 WHERE interval_minutes IS NULL;")
-        await self.conn.commit()
+        await self._commit()
 
     async def _ensure_schedule_config_button_templates(self) -> None:
         if not await self._table_exists("schedule_configs"):
@@ -219,7 +676,7 @@ class Database:
         if "button_templates" in cols:
             return
         await self.conn.execute("ALTER TABLE schedule_configs ADD COLUMN button_templates TEXT;")
-        await self.conn.commit()
+        await self._commit()
 
     async def _table_exists(self, name: str) -> bool:
         cur = await self.conn.execute(
@@ -229,6 +686,14 @@ class Database:
         row = await cur.fetchone()
         return row is not None
 
+    async def _index_exists(self, name: str) -> bool:
+        cur = await self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?",
+            (name,),
+        )
+        row = await cur.fetchone()
+        return row is not None
+
     async def _table_columns(self, name: str) -> set[str]:
         cur = await self.conn.execute(f"PRAGMA table_info({name})")
         rows = await cur.fetchall()
@@ -246,26 +711,38 @@ class Database:
         legacy = f"{name}_legacy"
         if await self._table_exists(legacy):
             return
+        # Committed together with the rest of the migration step by _init_schema.
         await self.conn.execute(f"ALTER TABLE {name} RENAME TO {legacy}")
-        await self.conn.commit()
 
     async def count_users(self) -> int:
-        cur = await self.conn.execute("SELECT COUNT(*) AS c FROM app_users")
+        cur = await self._reader().execute("SELECT COUNT(*) AS c FROM app_users")
         row = await cur.fetchone()
         return int(row["c"]) if row else 0
 
     async def create_user(self, *, username: str, password_hash: str) -> AppUser:
-        now = int(time.time())
-        cur = await self.conn.execute(
-            "INSERT INTO app_users(username, password_hash, created_at) VALUES(?, ?, ?)",
-            (username, password_hash, now),
-        )
-        await self.conn.commit()
+        now = _now()
+        if _SUPPORTS_RETURNING:
+            async with self._writing():
+                cur = await self.conn.execute(
+                    """
+                    INSERT INTO app_users(username, password_hash, created_at) VALUES(?, ?, ?)
+                    RETURNING id, username, password_hash, created_at
+                    """,
+                    (username, password_hash, now),
+                )
+                row = await cur.fetchone()
+                await cur.close()
+            return AppUser(*row)
+        async with self._writing():
+            cur = await self.conn.execute(
+                "INSERT INTO app_users(username, password_hash, created_at) VALUES(?, ?, ?)",
+                (username, password_hash, now),
+            )
         user_id = int(cur.lastrowid)
         return AppUser(id=user_id, username=username, password_hash=password_hash, created_at=now)
 
     async def get_user_by_username(self, username: str) -> AppUser | None:
-        cur = await self.conn.execute(
+        cur = await self._reader().execute(
             "SELECT id, username, password_hash, created_at FROM app_users WHERE username=?",
             (username,),
         )
@@ -280,7 +757,7 @@ class Database:
         )
 
     async def get_user_by_id(self, user_id: int) -> AppUser | None:
-        cur = await self.conn.execute(
+        cur = await self._reader().execute(
             "SELECT id, username, password_hash, created_at FROM app_users WHERE id=?",
             (int(user_id),),
         )
@@ -305,28 +782,48 @@ class Database:
         verify_ssl: bool,
         default_chat_id: int | None = None,
     ) -> Panel:
-        now = int(time.time())
-        cur = await self.conn.execute(
-            """
-            INSERT INTO panels(
-              owner_user_id, name, base_url, admin_username, admin_password_enc,
-              verify_ssl, default_chat_id, created_at, updated_at
-            )
-            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                int(owner_user_id),
-                name,
-                base_url.rstrip("/"),
-                admin_username,
-                admin_password_enc,
-                1 if verify_ssl else 0,
-                default_chat_id,
-                now,
-                now,
-            ),
+        now = _now()
+        params = (
+            int(owner_user_id),
+            name,
+            base_url.rstrip("/"),
+            admin_username,
+            admin_password_enc,
+            1 if verify_ssl else 0,
+            default_chat_id,
+            now,
+            now,
         )
-        await self.conn.commit()
+        if _SUPPORTS_RETURNING:
+            async with self._writing():
+                cur = await self.conn.execute(
+                    """
+                    INSERT INTO panels(
+                      owner_user_id, name, base_url, admin_username, admin_password_enc,
+                      verify_ssl, default_chat_id, created_at, updated_at
+                    )
+                    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    RETURNING id, owner_user_id, name, base_url, admin_username, admin_password_enc,
+                              verify_ssl, default_chat_id, created_at, updated_at
+                    """,
+                    params,
+                )
+                r = await cur.fetchone()
+                await cur.close()
+            self._forget(self._panel_cache)
+            return Panel(r[0], r[1], r[2], r[3], r[4], r[5], bool(r[6]), r[7], r[8], r[9])
+        async with self._writing():
+            cur = await self.conn.execute(
+                """
+                INSERT INTO panels(
+                  owner_user_id, name, base_url, admin_username, admin_password_enc,
+                  verify_ssl, default_chat_id, created_at, updated_at
+                )
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                params,
+            )
+        self._forget(self._panel_cache)
         panel_id = int(cur.lastrowid)
         return Panel(
             id=panel_id,
@@ -342,7 +839,7 @@ class Database:
         )
 
     async def list_panels(self, *, owner_user_id: int) -> list[Panel]:
-        cur = await self.conn.execute(
+        rows = self._iter_tuples(
             """
             SELECT id, owner_user_id, name, base_url, admin_username, admin_password_enc,
                    verify_ssl, default_chat_id, created_at, updated_at
@@ -352,76 +849,40 @@ class Database:
             """,
             (int(owner_user_id),),
         )
-        rows = await cur.fetchall()
-        out: list[Panel] = []
-        for row in rows:
-            out.append(
-                Panel(
-                    id=int(row["id"]),
-                    owner_user_id=int(row["owner_user_id"]),
-                    name=str(row["name"]),
-                    base_url=str(row["base_url"]),
-                    admin_username=str(row["admin_username"]),
-                    admin_password_enc=str(row["admin_password_enc"]),
-                    verify_ssl=bool(int(row["verify_ssl"])),
-                    default_chat_id=None if row["default_chat_id"] is None else int(row["default_chat_id"]),
-                    created_at=int(row["created_at"]),
-                    updated_at=int(row["updated_at"]),
-                )
-            )
-        return out
+        panel = Panel
+        return [panel(r[0], r[1], r[2], r[3], r[4], r[5], bool(r[6]), r[7], r[8], r[9]) async for r in rows]
 
     async def get_panel(self, *, owner_user_id: int, panel_id: int) -> Panel | None:
-        cur = await self.conn.execute(
-            """
-            SELECT id, owner_user_id, name, base_url, admin_username, admin_password_enc,
-                   verify_ssl, default_chat_id, created_at, updated_at
-            FROM panels
-            WHERE owner_user_id=? AND id=?
-            """,
-            (int(owner_user_id), int(panel_id)),
-        )
-        row = await cur.fetchone()
-        if row is None:
+        panel = await self.get_panel_by_id(panel_id)
+        if panel is None or panel.owner_user_id != int(owner_user_id):
             return None
-        return Panel(
-            id=int(row["id"]),
-            owner_user_id=int(row["owner_user_id"]),
-            name=str(row["name"]),
-            base_url=str(row["base_url"]),
-            admin_username=str(row["admin_username"]),
-            admin_password_enc=str(row["admin_password_enc"]),
-            verify_ssl=bool(int(row["verify_ssl"])),
-            default_chat_id=None if row["default_chat_id"] is None else int(row["default_chat_id"]),
-            created_at=int(row["created_at"]),
-            updated_at=int(row["updated_at"]),
-        )
+        return panel
 
     async def get_panel_by_id(self, panel_id: int) -> Panel | None:
-        cur = await self.conn.execute(
-            """
-            SELECT id, owner_user_id, name, base_url, admin_username, admin_password_enc,
-                   verify_ssl, default_chat_id, created_at, updated_at
-            FROM panels
-            WHERE id=?
-            """,
-            (int(panel_id),),
-        )
+        panel_id = int(panel_id)
+        cached = _cache_get(self._panel_cache, panel_id)
+        if cached is not _MISSING:
+            return cached
+        gen = self._cache_gen
+        cur = await self._reader().execute(_SQL_GET_PANEL_BY_ID, (panel_id,))
         row = await cur.fetchone()
-        if row is None:
-            return None
-        return Panel(
-            id=int(row["id"]),
-            owner_user_id=int(row["owner_user_id"]),
-            name=str(row["name"]),
-            base_url=str(row["base_url"]),
-            admin_username=str(row["admin_username"]),
-            admin_password_enc=str(row["admin_password_enc"]),
-            verify_ssl=bool(int(row["verify_ssl"])),
-            default_chat_id=None if row["default_chat_id"] is None else int(row["default_chat_id"]),
-            created_at=int(row["created_at"]),
-            updated_at=int(row["updated_at"]),
-        )
+        panel = None
+        if row is not None:
+            panel = Panel(
+                id=int(row["id"]),
+                owner_user_id=int(row["owner_user_id"]),
+                name=str(row["name"]),
+                base_url=str(row["base_url"]),
+                admin_username=str(row["admin_username"]),
+                admin_password_enc=str(row["admin_password_enc"]),
+                verify_ssl=bool(int(row["verify_ssl"])),
+                default_chat_id=None if row["default_chat_id"] is None else int(row["default_chat_id"]),
+                created_at=int(row["created_at"]),
+                updated_at=int(row["updated_at"]),
+            )
+        if gen == self._cache_gen:
+            _cache_put(self._panel_cache, panel_id, panel)
+        return panel
 
     async def update_panel(
         self,
@@ -435,53 +896,62 @@ class Database:
         verify_ssl: bool,
         default_chat_id: int | None,
     ) -> None:
-        now = int(time.time())
-        await self.conn.execute(
-            """
-            UPDATE panels
-            SET name=?,
-                base_url=?,
-                admin_username=?,
-                admin_password_enc=?,
-                verify_ssl=?,
-                default_chat_id=?,
-                updated_at=?
-            WHERE owner_user_id=? AND id=?
-            """,
-            (
-                name,
-                base_url.rstrip("/"),
-                admin_username,
-                admin_password_enc,
-                1 if verify_ssl else 0,
-                default_chat_id,
-                now,
-                int(owner_user_id),
-                int(panel_id),
-            ),
-        )
-        await self.conn.commit()
+        now = _now()
+        async with self._writing():
+            await self.conn.execute(
+                """
+                UPDATE panels
+                SET name=?,
+                    base_url=?,
+                    admin_username=?,
+                    admin_password_enc=?,
+                    verify_ssl=?,
+                    default_chat_id=?,
+                    updated_at=?
+                WHERE owner_user_id=? AND id=?
+                """,
+                (
+                    name,
+                    base_url.rstrip("/"),
+                    admin_username,
+                    admin_password_enc,
+                    1 if verify_ssl else 0,
+                    default_chat_id,
+                    now,
+                    int(owner_user_id),
+                    int(panel_id),
+                ),
+            )
+        self._forget(self._panel_cache, int(panel_id))
 
     async def delete_panel(self, *, owner_user_id: int, panel_id: int) -> None:
-        await self.conn.execute(
-            "DELETE FROM panels WHERE owner_user_id=? AND id=?",
-            (int(owner_user_id), int(panel_id)),
-        )
-        await self.conn.commit()
+        async with self._writing():
+            await self.conn.execute(
+                "DELETE FROM panels WHERE owner_user_id=? AND id=?",
+                (int(owner_user_id), int(panel_id)),
+            )
+        # ON DELETE CASCADE also drops the panel's bindings.
+        self._invalidate_caches()
 
     async def get_telegram_config(self) -> TelegramConfig:
-        cur = await self.conn.execute(
-            "SELECT bot_token, admin_user_ids, webhook_url, updated_at FROM telegram_config WHERE id=1"
-        )
+        cached = _cache_get(self._telegram_config_cache, 1)
+        if cached is not _MISSING:
+            return cached
+        gen = self._cache_gen
+        cur = await self._reader().execute(_SQL_GET_TELEGRAM_CONFIG)
         row = await cur.fetchone()
         if row is None:
-            return TelegramConfig(bot_token=None, admin_user_ids=None, webhook_url=None, updated_at=0)
-        return TelegramConfig(
-            bot_token=None if row["bot_token"] is None else str(row["bot_token"]),
-            admin_user_ids=None if row["admin_user_ids"] is None else str(row["admin_user_ids"]),
-            webhook_url=None if row["webhook_url"] is None else str(row["webhook_url"]),
-            updated_at=int(row["updated_at"]),
-        )
+            cfg = TelegramConfig(bot_token=None, admin_user_ids=None, webhook_url=None, updated_at=0)
+        else:
+            cfg = TelegramConfig(
+                bot_token=None if row["bot_token"] is None else str(row["bot_token"]),
+                admin_user_ids=None if row["admin_user_ids"] is None else str(row["admin_user_ids"]),
+                webhook_url=None if row["webhook_url"] is None else str(row["webhook_url"]),
+                updated_at=int(row["updated_at"]),
+            )
+        if gen == self._cache_gen:
+            _cache_put(self._telegram_config_cache, 1, cfg)
+        return cfg
 
     async def set_telegram_config(
         self,
@@ -490,40 +960,48 @@ class Database:
         admin_user_ids: str | None,
         webhook_url: str | None,
     ) -> None:
-        now = int(time.time())
-        await self.conn.execute(
-            """
-            INSERT INTO telegram_config(id, bot_token, admin_user_ids, webhook_url, updated_at)
-            VALUES(1, ?, ?, ?, ?)
-            ON CONFLICT(id) DO UPDATE SET
-              bot_token=excluded.bot_token,
-              admin_user_ids=excluded.admin_user_ids,
-              webhook_url=excluded.webhook_url,
-              updated_at=excluded.updated_at
-            """,
-            (bot_token, admin_user_ids, webhook_url, now),
-        )
-        await self.conn.commit()
+        now = _now()
+        async with self._writing():
+            await self.conn.execute(
+                """
+                INSERT INTO telegram_config(id, bot_token, admin_user_ids, webhook_url, updated_at)
+                VALUES(1, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                  bot_token=excluded.bot_token,
+                  admin_user_ids=excluded.admin_user_ids,
+                  webhook_url=excluded.webhook_url,
+                  updated_at=excluded.updated_at
+                """,
+                (bot_token, admin_user_ids, webhook_url, now),
+            )
+        self._forget(self._telegram_config_cache)
 
     async def set_kv(self, key: str, value: str) -> None:
-        now = int(time.time())
-        await self.conn.execute(
-            """
-            INSERT INTO kv(key, value, updated_at)
-            VALUES(?, ?, ?)
-            ON CONFLICT(key) DO UPDATE SET
-              value=excluded.value,
-              updated_at=excluded.updated_at
-            """,
-            (key, value, now),
-        )
-        await self.conn.commit()
+        now = _now()
+        async with self._writing():
+            await self.conn.execute(_SQL_SET_KV, (key, value, now))
+
+    async def set_kv_many(self, pairs: dict[str, str]) -> None:
+        """Upsert several kv entries with a single commit."""
+        if not pairs:
+            return
+        now = _now()
+        async with self._writing():
+            await self.conn.executemany(_SQL_SET_KV, [(key, value, now) for key, value in pairs.items()])
 
     async def get_kv(self, key: str) -> str | None:
-        cur = await self.conn.execute("SELECT value FROM kv WHERE key=?", (key,))
+        cur = await self._reader().execute(_SQL_GET_KV, (key,))
         row = await cur.fetchone()
         return None if row is None else str(row["value"])
 
+    async def get_kv_many(self, keys: list[str]) -> dict[str, str]:
+        """Read several kv entries in one query; missing keys are absent from the result."""
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        sql = f"SELECT key, value FROM kv WHERE key IN ({placeholders})"
+        return {str(k): str(v) async for k, v in self._iter_tuples(sql, tuple(keys))}
+
     async def upsert_binding(
         self,
         *,
@@ -532,42 +1010,41 @@ class Database:
         user_id: int | None,
         panel_id: int = 1,
     ) -> None:
-        now = int(time.time())
-        await self.conn.execute(
-            """
-            INSERT INTO bindings(panel_id, username, chat_id, user_id, updated_at)
-            VALUES(?, ?, ?, ?, ?)
-            ON CONFLICT(panel_id, username) DO UPDATE SET
-              chat_id=excluded.chat_id,
-              user_id=excluded.user_id,
-              updated_at=excluded.updated_at
-            """,
-            (int(panel_id), username, chat_id, user_id, now),
-        )
-        await self.conn.commit()
+        now = _now()
+        async with self._writing():
+            await self.conn.execute(
+                """
+                INSERT INTO bindings(panel_id, username, chat_id, user_id, updated_at)
+                VALUES(?, ?, ?, ?, ?)
+                ON CONFLICT(panel_id, username) DO UPDATE SET
+                  chat_id=excluded.chat_id,
+                  user_id=excluded.user_id,
+                  updated_at=excluded.updated_at
+                """,
+                (int(panel_id), username, chat_id, user_id, now),
+            )
+        self._forget(self._binding_cache, (int(panel_id), username))
 
     async def get_binding(self, *, username: str, panel_id: int = 1) -> Binding | None:
-        cur = await self.conn.execute(
-            "SELECT panel_id, username, chat_id, user_id, updated_at FROM bindings WHERE panel_id=? AND username=?",
-            (int(panel_id), username),
-        )
+        key = (int(panel_id), username)
+        cached = _cache_get(self._binding_cache, key)
+        if cached is not _MISSING:
+            return cached
+        gen = self._cache_gen
+        cur = await self._reader().execute(_SQL_GET_BINDING, key)
         row = await cur.fetchone()
-        if row is None:
-            return None
-        return Binding(
-            panel_id=int(row["panel_id"]),
-            username=str(row["username"]),
-            chat_id=int(row["chat_id"]),
-            user_id=None if row["user_id"] is None else int(row["user_id"]),
-            updated_at=int(row["updated_at"]),
-        )
+        binding = None if row is None else Binding._from_row(tuple(row))
+        if gen == self._cache_gen:
+            _cache_put(self._binding_cache, key, binding)
+        return binding
 
     async def delete_binding(self, *, username: str, panel_id: int = 1) -> None:
-        await self.conn.execute(
-            "DELETE FROM bindings WHERE panel_id=? AND username=?",
-            (int(panel_id), username),
-        )
-        await self.conn.commit()
+        async with self._writing():
+            await self.conn.execute(
+                "DELETE FROM bindings WHERE panel_id=? AND username=?",
+                (int(panel_id), username),
+            )
+        self._forget(self._binding_cache, (int(panel_id), username))
 
     async def set_schedule(
         self,
@@ -580,36 +1057,37 @@ class Database:
     ) -> None:
         interval_minutes = int(interval_minutes)
         interval_hours = max(0, interval_minutes // 60)
-        await self.conn.execute(
-            """
-            INSERT INTO schedules(panel_id, username, interval_hours, interval_minutes, next_run_at, enabled)
-            VALUES(?, ?, ?, ?, ?, ?)
-            ON CONFLICT(panel_id, username) DO UPDATE SET
-              interval_hours=excluded.interval_hours,
-              interval_minutes=excluded.interval_minutes,
-              next_run_at=excluded.next_run_at,
-              enabled=excluded.enabled
-            """,
-            (int(panel_id), username, interval_hours, interval_minutes, next_run_at, 1 if enabled else 0),
-        )
-        await self.conn.commit()
+        async with self._writing():
+            await self.conn.execute(
+                _SQL_SET_SCHEDULE,
+                (int(panel_id), username, interval_hours, interval_minutes, next_run_at, 1 if enabled else 0),
+            )
+        self._schedules_version += 1
+
+    async def set_schedule_bulk(self, rows: list[tuple[str, int, int, bool]], *, panel_id: int = 1) -> None:
+        """Upsert many schedules with one executemany inside a single transaction.
+
+        Each row is ``(username, interval_minutes, next_run_at, enabled)``.
+        """
+        if not rows:
+            return
+        params = [
+            (int(panel_id), username, max(0, int(minutes) // 60), int(minutes), int(next_run_at), 1 if enabled else 0)
+            for username, minutes, next_run_at, enabled in rows
+        ]
+        async with self.transaction():
+            await self.conn.executemany(_SQL_SET_SCHEDULE, params)
 
     async def disable_schedule(self, *, username: str, panel_id: int = 1) -> None:
-        await self.conn.execute(
-            "UPDATE schedules SET enabled=0 WHERE panel_id=? AND username=?",
-            (int(panel_id), username),
-        )
-        await self.conn.commit()
+        async with self._writing():
+            await self.conn.execute(
+                "UPDATE schedules SET enabled=0 WHERE panel_id=? AND username=?",
+                (int(panel_id), username),
+            )
+        self._schedules_version += 1
 
     async def get_schedule(self, *, username: str, panel_id: int = 1) -> Schedule | None:
-        cur = await self.conn.execute(
-            """
-            SELECT panel_id, username, COALESCE(interval_minutes, interval_hours * 60) AS interval_minutes, next_run_at, enabled, last_run_at, last_error
-            FROM schedules
-            WHERE panel_id=? AND username=?
-            """,
-            (int(panel_id), username),
-        )
+        cur = await self._reader().execute(_SQL_GET_SCHEDULE, (int(panel_id), username))
         row = await cur.fetchone()
         if row is None:
             return None
@@ -625,9 +1103,9 @@ class Database:
 
     async def list_schedules(self, *, panel_id: int | None = None, limit: int = 50) -> list[Schedule]:
         if panel_id is None:
-            cur = await self.conn.execute(
+            rows = self._iter_tuples(
                 """
-                SELECT panel_id, username, COALESCE(interval_minutes, interval_hours * 60) AS interval_minutes, next_run_at, enabled, last_run_at, last_error
+                SELECT panel_id, username, interval_minutes, next_run_at, enabled, last_run_at, last_error
                 FROM schedules
                 ORDER BY next_run_at ASC
                 LIMIT ?
@@ -635,9 +1113,9 @@ class Database:
                 (int(limit),),
             )
         else:
-            cur = await self.conn.execute(
+            rows = self._iter_tuples(
                 """
-                SELECT panel_id, username, COALESCE(interval_minutes, interval_hours * 60) AS interval_minutes, next_run_at, enabled, last_run_at, last_error
+                SELECT panel_id, username, interval_minutes, next_run_at, enabled, last_run_at, last_error
                 FROM schedules
                 WHERE panel_id=?
                 ORDER BY next_run_at ASC
@@ -645,21 +1123,8 @@ class Database:
                 """,
                 (int(panel_id), int(limit)),
             )
-        rows = await cur.fetchall()
-        out: list[Schedule] = []
-        for row in rows:
-            out.append(
-                Schedule(
-                    panel_id=int(row["panel_id"]),
-                    username=str(row["username"]),
-                    interval_minutes=int(row["interval_minutes"]),
-                    next_run_at=int(row["next_run_at"]),
-                    enabled=bool(int(row["enabled"])),
-                    last_run_at=None if row["last_run_at"] is None else int(row["last_run_at"]),
-                    last_error=None if row["last_error"] is None else str(row["last_error"]),
-                )
-            )
-        return out
+        from_row = Schedule._from_row
+        return [from_row(r) async for r in rows]
 
     async def list_schedules_for_owner(
         self,
@@ -670,7 +1135,7 @@ class Database:
     ) -> list[Schedule]:
         if panel_id is None:
             sql = """
-            SELECT s.panel_id, s.username, COALESCE(s.interval_minutes, s.interval_hours * 60) AS interval_minutes, s.next_run_at, s.enabled, s.last_run_at, s.last_error
+            SELECT s.panel_id, s.username, s.interval_minutes, s.next_run_at, s.enabled, s.last_run_at, s.last_error
             FROM schedules s
             JOIN panels p ON p.id = s.panel_id
             WHERE p.owner_user_id=?
@@ -680,7 +1145,7 @@ class Database:
             params = (int(owner_user_id), int(limit))
         else:
             sql = """
-            SELECT s.panel_id, s.username, COALESCE(s.interval_minutes, s.interval_hours * 60) AS interval_minutes, s.next_run_at, s.enabled, s.last_run_at, s.last_error
+            SELECT s.panel_id, s.username, s.interval_minutes, s.next_run_at, s.enabled, s.last_run_at, s.last_error
             FROM schedules s
             JOIN panels p ON p.id = s.panel_id
             WHERE p.owner_user_id=? AND s.panel_id=?
@@ -688,49 +1153,54 @@ class Database:
             LIMIT ?
             """
             params = (int(owner_user_id), int(panel_id), int(limit))
-        cur = await self.conn.execute(sql, params)
-        rows = await cur.fetchall()
-        out: list[Schedule] = []
-        for row in rows:
-            out.append(
-                Schedule(
-                    panel_id=int(row["panel_id"]),
-                    username=str(row["username"]),
-                    interval_minutes=int(row["interval_minutes"]),
-                    next_run_at=int(row["next_run_at"]),
-                    enabled=bool(int(row["enabled"])),
-                    last_run_at=None if row["last_run_at"] is None else int(row["last_run_at"]),
-                    last_error=None if row["last_error"] is None else str(row["last_error"]),
-                )
-            )
-        return out
+        rows = self._iter_tuples(sql, params)
+        from_row = Schedule._from_row
+        return [from_row(r) async for r in rows]
 
     async def get_due_schedules(self, *, now: int) -> list[Schedule]:
-        cur = await self.conn.execute(
-            """
-            SELECT panel_id, username, COALESCE(interval_minutes, interval_hours * 60) AS interval_minutes, next_run_at, enabled, last_run_at, last_error
-            FROM schedules
-            WHERE enabled=1 AND next_run_at <= ?
-            ORDER BY next_run_at ASC
-            """,
-            (now,),
-        )
-        rows = await cur.fetchall()
-        out: list[Schedule] = []
-        for row in rows:
-            out.append(
-                Schedule(
-                    panel_id=int(row["panel_id"]),
-                    username=str(row["username"]),
-                    interval_minutes=int(row["interval_minutes"]),
-                    next_run_at=int(row["next_run_at"]),
-                    enabled=True,
-                    last_run_at=None if row["last_run_at"] is None else int(row["last_run_at"]),
-                    last_error=None if row["last_error"] is None else str(row["last_error"]),
-                )
-            )
+        rows = self._iter_tuples(_SQL_GET_DUE_SCHEDULES, (int(now),))
+        from_row = Schedule._from_row
+        return [from_row(r) async for r in rows]
+
+    async def get_due_schedule_bundles(
+        self, *, now: int, limit: int = 500
+    ) -> list[tuple[Schedule, ScheduleConfig | None, ScheduleMessageState | None, Binding | None]]:
+        # One query per tick instead of a config + message-state + binding lookup per due schedule.
+        out: list[tuple[Schedule, ScheduleConfig | None, ScheduleMessageState | None, Binding | None]] = []
+        async for row in self._iter_tuples(_SQL_GET_DUE_SCHEDULE_BUNDLES, (int(now), int(limit))):
+            cfg = None if row[7] is None else ScheduleConfig._from_row(row[7:14])
+            state = None if row[14] is None else ScheduleMessageState._from_row(row[14:20])
+            binding = None if row[20] is None else Binding._from_row(row[20:25])
+            out.append((Schedule._from_row(row), cfg, state, binding))
         return out
 
+    async def get_min_next_run(self) -> int | None:
+        # Served straight from idx_schedules_due(enabled, next_run_at).
+        cur = await self._reader().execute("SELECT MIN(next_run_at) FROM schedules WHERE enabled=1")
+        row = await cur.fetchone()
+        if row is None or row[0] is None:
+            return None
+        return int(row[0])
+
+    async def sleep_until_next_due(self, poll_interval_seconds: int) -> None:
+        """Sleep until the earliest enabled schedule is due, capped at five minutes."""
+        poll = max(5, int(poll_interval_seconds))
+        version = self._schedules_version
+        min_next_run = await self.get_min_next_run()
+        if min_next_run is None:
+            wait = _MAX_IDLE_SLEEP_SECONDS
+        else:
+            wait = max(poll, min(min_next_run - _now(), _MAX_IDLE_SLEEP_SECONDS))
+        # Wake every poll interval only to check the in-memory version; a schedule edit made
+        # by this process cuts the sleep short, anything else waits at most the idle cap.
+        slept = 0
+        while slept < wait:
+            step = min(poll, wait - slept)
+            await asyncio.sleep(step)
+            slept += step
+            if self._schedules_version != version:
+                return
+
     async def mark_schedule_result(
         self,
         *,
@@ -740,57 +1210,41 @@ class Database:
         last_error: str | None,
         panel_id: int = 1,
     ) -> None:
-        await self.conn.execute(
-            """
-            UPDATE schedules
-            SET next_run_at=?, last_run_at=?, last_error=?
-            WHERE panel_id=? AND username=?
-            """,
-            (next_run_at, last_run_at, last_error, int(panel_id), username),
-        )
-        await self.conn.commit()
+        async with self._writing():
+            await self.conn.execute(
+                _SQL_MARK_SCHEDULE_RESULT,
+                (next_run_at, last_run_at, last_error, int(panel_id), username),
+            )
+        self._schedules_version += 1
+
+    async def mark_schedule_results_bulk(self, rows: list[tuple[int, int, str | None, int, str]]) -> None:
+        """Apply many mark_schedule_result updates with one executemany and one commit.
+
+        Each row is ``(next_run_at, last_run_at, last_error, panel_id, username)``.
+        """
+        if not rows:
+            return
+        async with self._writing():
+            await self.conn.executemany(_SQL_MARK_SCHEDULE_RESULT, rows)
+        self._schedules_version += 1
 
     async def get_schedule_config(self, *, username: str, panel_id: int = 1) -> ScheduleConfig | None:
-        cur = await self.conn.execute(
-            """
-            SELECT panel_id, username, message_template, selected_link_keys, button_templates, updated_at
-            FROM schedule_configs
-            WHERE panel_id=? AND username=?
-            """,
-            (int(panel_id), username),
-        )
+        cur = await self._reader().execute(_SQL_GET_SCHEDULE_CONFIG, (int(panel_id), username))
         row = await cur.fetchone()
         if row is None:
             return None
+        return ScheduleConfig._from_row(tuple(row))
 
-        selected_raw = None if row["selected_link_keys"] is None else str(row["selected_link_keys"])
-        selected: list[str] = []
-        if selected_raw:
-            try:
-                parsed = json.loads(selected_raw)
-                if isinstance(parsed, list):
-                    selected = [str(x) for x in parsed if str(x).strip()]
-            except Exception:
-                selected = []
-
-        buttons_raw = None if row["button_templates"] is None else str(row["button_templates"])
-        buttons: list[str] = []
-        if buttons_raw:
-            try:
-                parsed = json.loads(buttons_raw)
-                if isinstance(parsed, list):
-                    buttons = [str(x or "").strip() for x in parsed]
-            except Exception:
-                buttons = []
-
-        return ScheduleConfig(
-            panel_id=int(row["panel_id"]),
-            username=str(row["username"]),
-            message_template=None if row["message_template"] is None else str(row["message_template"]),
-            selected_link_keys=selected,
-            button_templates=buttons,
-            updated_at=int(row["updated_at"]),
+    async def list_templated_schedule_configs(self) -> list[ScheduleConfig]:
+        rows = self._iter_tuples(
+            """
+            SELECT panel_id, username, message_template, selected_link_keys, button_templates, updated_at, keys_migrated_at
+            FROM schedule_configs
+            WHERE message_template IS NOT NULL
+            """
         )
+        from_row = ScheduleConfig._from_row
+        return [from_row(r) async for r in rows]
 
     async def set_schedule_config(
         self,
@@ -800,70 +1254,55 @@ class Database:
         message_template: str | None,
         selected_link_keys: list[str] | None,
         button_templates: list[str] | None,
+        keys_migrated: bool = False,
     ) -> None:
-        now = int(time.time())
+        now = _now()
         selected_json = None
         if selected_link_keys:
-            selected_json = json.dumps(list(selected_link_keys), ensure_ascii=False)
+            selected_json = _json_dumps(list(selected_link_keys))
 
         buttons_json = None
         if button_templates:
-            buttons_json = json.dumps(list(button_templates), ensure_ascii=False)
+            buttons_json = _json_dumps(list(button_templates))
 
-        await self.conn.execute(
-            """
-            INSERT INTO schedule_configs(panel_id, username, message_template, selected_link_keys, button_templates, updated_at)
-            VALUES(?, ?, ?, ?, ?, ?)
-            ON CONFLICT(panel_id, username) DO UPDATE SET
-              message_template=excluded.message_template,
-              selected_link_keys=excluded.selected_link_keys,
-              button_templates=excluded.button_templates,
-              updated_at=excluded.updated_at
-            """,
-            (int(panel_id), username, message_template, selected_json, buttons_json, now),
-        )
-        await self.conn.commit()
+        async with self._writing():
+            await self.conn.execute(
+                """
+                INSERT INTO schedule_configs(
+                  panel_id, username, message_template, selected_link_keys, button_templates, updated_at, keys_migrated_at
+                )
+                VALUES(?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(panel_id, username) DO UPDATE SET
+                  message_template=excluded.message_template,
+                  selected_link_keys=excluded.selected_link_keys,
+                  button_templates=excluded.button_templates,
+                  updated_at=excluded.updated_at,
+                  keys_migrated_at=excluded.keys_migrated_at
+                """,
+                (
+                    int(panel_id),
+                    username,
+                    message_template,
+                    selected_json,
+                    buttons_json,
+                    now,
+                    now if keys_migrated else None,
+                ),
+            )
+
+    async def mark_schedule_keys_migrated(self, *, username: str, panel_id: int) -> None:
+        async with self._writing():
+            await self.conn.execute(
+                "UPDATE schedule_configs SET keys_migrated_at=? WHERE panel_id=? AND username=?",
+                (_now(), int(panel_id), username),
+            )
 
     async def get_schedule_message_state(self, *, username: str, panel_id: int = 1) -> ScheduleMessageState | None:
-        cur = await self.conn.execute(
-            """
-            SELECT panel_id, username, chat_id, message_ids, message_texts, updated_at
-            FROM schedule_message_states
-            WHERE panel_id=? AND username=?
-            """,
-            (int(panel_id), username),
-        )
+        cur = await self._reader().execute(_SQL_GET_SCHEDULE_MESSAGE_STATE, (int(panel_id), username))
         row = await cur.fetchone()
         if row is None:
             return None
-
-        message_ids_raw = str(row["message_ids"] or "[]")
-        message_texts_raw = str(row["message_texts"] or "[]")
-
-        message_ids: list[int] = []
-        try:
-            parsed = json.loads(message_ids_raw)
-            if isinstance(parsed, list):
-                message_ids = [int(x) for x in parsed if isinstance(x, int) or str(x).isdigit()]
-        except Exception:
-            message_ids = []
-
-        message_texts: list[str] = []
-        try:
-            parsed = json.loads(message_texts_raw)
-            if isinstance(parsed, list):
-                message_texts = [str(x or "") for x in parsed]
-        except Exception:
-            message_texts = []
-
-        return ScheduleMessageState(
-            panel_id=int(row["panel_id"]),
-            username=str(row["username"]),
-            chat_id=int(row["chat_id"]),
-            message_ids=message_ids,
-            message_texts=message_texts,
-            updated_at=int(row["updated_at"]),
-        )
+        return ScheduleMessageState._from_row(tuple(row))
 
     async def set_schedule_message_state(
         self,
@@ -874,43 +1313,52 @@ class Database:
         message_ids: list[int],
         message_texts: list[str],
     ) -> None:
-        now = int(time.time())
-        ids_json = json.dumps([int(x) for x in (message_ids or [])], ensure_ascii=False)
-        texts_json = json.dumps([str(x or "") for x in (message_texts or [])], ensure_ascii=False)
+        row = _message_state_row(panel_id, username, chat_id, message_ids, message_texts, _now())
+        async with self._writing():
+            await self.conn.execute(_SQL_SET_SCHEDULE_MESSAGE_STATE, row)
 
-        await self.conn.execute(
-            """
-            INSERT INTO schedule_message_states(panel_id, username, chat_id, message_ids, message_texts, updated_at)
-            VALUES(?, ?, ?, ?, ?, ?)
-            ON CONFLICT(panel_id, username) DO UPDATE SET
-              chat_id=excluded.chat_id,
-              message_ids=excluded.message_ids,
-              message_texts=excluded.message_texts,
-              updated_at=excluded.updated_at
-            """,
-            (int(panel_id), username, int(chat_id), ids_json, texts_json, now),
-        )
-        await self.conn.commit()
+    async def flush_schedule_writes(
+        self,
+        results: list[tuple[int, int, str | None, int, str]],
+        message_states: list[tuple[int, str, int, list[int], list[str]]],
+    ) -> None:
+        """Write one scheduler tick's buffered rows with a single commit.
 
-    async def migrate_legacy_data(self, *, default_panel_id: int) -> None:
-        if await self._table_exists("bindings_legacy"):
-            await self.conn.execute(
-                """
-                INSERT OR IGNORE INTO bindings(panel_id, username, chat_id, user_id, updated_at)
-                SELECT ?, username, chat_id, user_id, updated_at
-                FROM bindings_legacy
-                """,
-                (int(default_panel_id),),
-            )
-            await self.conn.commit()
+        ``results`` rows are as for mark_schedule_results_bulk; ``message_states`` rows are
+        ``(panel_id, username, chat_id, message_ids, message_texts)``.
+        """
+        if not results and not message_states:
+            return
+        now = _now()
+        rows = [_message_state_row(*state, now) for state in message_states]
+        async with self._writing():
+            if rows:
+                await self.conn.executemany(_SQL_SET_SCHEDULE_MESSAGE_STATE, rows)
+            if results:
+                await self.conn.executemany(_SQL_MARK_SCHEDULE_RESULT, results)
+        self._schedules_version += 1
 
-        if await self._table_exists("schedules_legacy"):
-            await self.conn.execute(
-                """
-                INSERT OR IGNORE INTO schedules(panel_id, username, interval_hours, interval_minutes, next_run_at, enabled, last_run_at, last_error)
-                SELECT ?, username, interval_hours, interval_hours * 60, next_run_at, enabled, last_run_at, last_error
-                FROM schedules_legacy
-                """,
-                (int(default_panel_id),),
-            )
-            await self.conn.commit()
+    async def migrate_legacy_data(self, *, default_panel_id: int) -> None:
+        # Copy and drop in one transaction so later panel creations find nothing to migrate.
+        async with self.transaction():
+            if await self._table_exists("bindings_legacy"):
+                await self.conn.execute(
+                    """
+                    INSERT OR IGNORE INTO bindings(panel_id, username, chat_id, user_id, updated_at)
+                    SELECT ?, username, chat_id, user_id, updated_at
+                    FROM bindings_legacy
+                    """,
+                    (int(default_panel_id),),
+                )
+                await self.conn.execute("DROP TABLE bindings_legacy")
+
+            if await self._table_exists("schedules_legacy"):
+                await self.conn.execute(
+                    """
+                    INSERT OR IGNORE INTO schedules(panel_id, username, interval_hours, interval_minutes, next_run_at, enabled, last_run_at, last_error)
+                    SELECT ?, username, interval_hours, interval_hours * 60, next_run_at, enabled, last_run_at, last_error
+                    FROM schedules_legacy
+                    """,
+                    (int(default_panel_id),),
+                )
+                await self.conn.execute("DROP TABLE schedules_legacy")
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import functools
 from dataclasses import dataclass
 from datetime import UTC, datetime
 from zoneinfo import ZoneInfo
 
 
+@functools.lru_cache(maxsize=32)
 def get_tz(tz_name: str):
     try:
         return ZoneInfo(tz_name)
@@ -12,21 +14,21 @@ def get_tz(tz_name: str):
         return UTC
 
 
+_BYTE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
+_BYTE_THRESHOLDS = tuple(1024**i for i in range(len(_BYTE_UNITS)))
+
+
+# Plan sizes (data_limit) repeat across users and requests; usage values simply age out.
+@functools.lru_cache(maxsize=2048)
 def format_bytes(num: int | None) -> str:
     if num is None:
         return "-"
     if num < 0:
         return str(num)
-    units = ["B", "KB", "MB", "GB", "TB", "PB"]
-    value = float(num)
-    unit = units[0]
-    for unit in units:
-        if value < 1024.0 or unit == units[-1]:
-            break
-        value /= 1024.0
-    if unit == "B":
-        return f"{int(value)} {unit}"
-    return f"{value:.2f} {unit}"
+    if num < 1024:
+        return f"{int(num)} B"
+    idx = min((int(num).bit_length() - 1) // 10, 5)
+    return f"{num / _BYTE_THRESHOLDS[idx]:.2f} {_BYTE_UNITS[idx]}"
 
 
 def format_dt(value: datetime | None, tz_name: str) -> str:
@@ -36,12 +38,32 @@ def format_dt(value: datetime | None, tz_name: str) -> str:
     return value.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S %Z")
 
 
+@functools.lru_cache(maxsize=4096)
+def format_epoch(epoch: int, tz_name: str) -> str:
+    # Schedule listings format the same next_run_at values over and over.
+    return format_dt(datetime.fromtimestamp(int(epoch), tz=UTC), tz_name)
+
+
+# Bound once at import; the parsers below run several times per user per report.
+_fromisoformat = datetime.fromisoformat
+_fromtimestamp = datetime.fromtimestamp
+
+
+def utf16_len(text: str) -> int:
+    """Length in UTF-16 code units, which is how Telegram counts text and caption limits."""
+    raw = text or ""
+    # BMP-only text (ASCII, Persian) is one code unit per char; only astral chars (emoji) need two.
+    if raw.isascii() or max(raw) <= "\uffff":
+        return len(raw)
+    return len(raw) + sum(1 for ch in raw if ch > "\uffff")
+
+
 def parse_iso_dt(value: str | None) -> datetime | None:
     if not value:
         return None
     try:
-        # FastAPI returns ISO datetime strings.
-        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        # FastAPI returns ISO datetime strings; fromisoformat accepts a trailing "Z" on 3.11+.
+        return _fromisoformat(value)
     except Exception:
         return None
 
@@ -50,7 +72,10 @@ def parse_epoch_seconds(value: int | None) -> datetime | None:
     if value is None:
         return None
     try:
-        return datetime.fromtimestamp(int(value), tz=UTC)
+        # Values from JSON are already ints; only cast other inputs.
+        if type(value) is int:
+            return _fromtimestamp(value, tz=UTC)
+        return _fromtimestamp(int(value), tz=UTC)
     except Exception:
         return None
 
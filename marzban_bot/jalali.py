@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 from dataclasses import dataclass
 from datetime import UTC, datetime
 from zoneinfo import ZoneInfo
@@ -15,6 +16,7 @@ class JalaliDate:
         return f"{self.year:04d}-{self.month:02d}-{self.day:02d}"
 
 
+@functools.lru_cache(maxsize=32)
 def _get_tz(tz_name: str):
     try:
         return ZoneInfo(tz_name)
@@ -22,88 +24,107 @@ def _get_tz(tz_name: str):
         return UTC
 
 
-def gregorian_to_jalali(gy: int, gm: int, gd: int) -> JalaliDate:
-    g_d_m = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+# Fixed-date (Rata Die) conversion after roozbehp/persiancalendar's persiancalendar_fast
+# (Apache-2.0): the 33-year leap rule plus a table of years where it disagrees with the
+# astronomical calendar, accurate for 1178-3000 AP. The classical 33-year-cycle formula
+# drifts from 1502 AP onwards (e.g. 2124-03-20 is 1503-01-01, not 1502-12-30).
+_PERSIAN_EPOCH = 226896  # fixed date of 1 Farvardin 1 AP (622-03-19 Julian)
+_NON_LEAP_CORRECTION = frozenset(
+    (
+        1502, 1601, 1634, 1667, 1700, 1733, 1766, 1799, 1832, 1865, 1898,
+        1931, 1964, 1997, 2030, 2059, 2063, 2096, 2129, 2158, 2162, 2191,
+        2224, 2257, 2290, 2319, 2323, 2352, 2356, 2385, 2389, 2418, 2422,
+        2451, 2455, 2484, 2488, 2517, 2521, 2550, 2554, 2583, 2587, 2616,
+        2620, 2649, 2653, 2682, 2686, 2715, 2719, 2748, 2752, 2781, 2785,
+        2814, 2818, 2847, 2851, 2880, 2884, 2913, 2917, 2946, 2950, 2979,
+        2983,
+    )
+)
+
 
-    if gy > 1600:
-        jy = 979
-        gy -= 1600
+def _fixed_from_gregorian(gy: int, gm: int, gd: int) -> int:
+    py = gy - 1
+    if gm <= 2:
+        correction = 0
+    elif gy % 4 == 0 and (gy % 100 != 0 or gy % 400 == 0):
+        correction = -1
     else:
-        jy = 0
-        gy -= 621
-
-    gy2 = gy + 1 if gm > 2 else gy
-    days = (
-        365 * gy
-        + (gy2 + 3) // 4
-        - (gy2 + 99) // 100
-        + (gy2 + 399) // 400
-        - 80
-        + gd
-        + g_d_m[gm - 1]
-    )
+        correction = -2
+    return 365 * py + py // 4 - py // 100 + py // 400 + (367 * gm - 362) // 12 + correction + gd
 
-    jy += 33 * (days // 12053)
-    days %= 12053
-    jy += 4 * (days // 1461)
-    days %= 1461
 
-    if days > 365:
-        jy += (days - 1) // 365
-        days = (days - 1) % 365
+def _persian_new_year(jy: int) -> int:
+    fixed = _PERSIAN_EPOCH - 1 + 365 * (jy - 1) + (8 * jy + 21) // 33
+    if jy - 1 in _NON_LEAP_CORRECTION:
+        fixed -= 1
+    return fixed
 
-    if days < 186:
-        jm = 1 + days // 31
-        jd = 1 + (days % 31)
-    else:
-        jm = 7 + (days - 186) // 30
-        jd = 1 + ((days - 186) % 30)
 
-    return JalaliDate(year=int(jy), month=int(jm), day=int(jd))
+def _persian_from_fixed(fixed: int) -> tuple[int, int, int]:
+    jy = 1 + (33 * (fixed - _PERSIAN_EPOCH) + 3) // 12053
+    new_year = _persian_new_year(jy)
+    if fixed < new_year:
+        jy -= 1
+        new_year = _persian_new_year(jy)
+    elif fixed >= _persian_new_year(jy + 1):
+        jy += 1
+        new_year = _persian_new_year(jy)
+
+    day_of_year = fixed - new_year
+    if day_of_year < 186:
+        return jy, 1 + day_of_year // 31, 1 + day_of_year % 31
+    day_of_year -= 186
+    return jy, 7 + day_of_year // 30, 1 + day_of_year % 30
+
+
+def gregorian_to_jalali(gy: int, gm: int, gd: int) -> JalaliDate:
+    jy, jm, jd = _persian_from_fixed(_fixed_from_gregorian(gy, gm, gd))
+    return JalaliDate(year=jy, month=jm, day=jd)
+
+
+@functools.lru_cache(maxsize=1024)
+def _jalali_date_str(gy: int, gm: int, gd: int) -> str:
+    # A scheduler tick formats the same few local dates for every user.
+    return gregorian_to_jalali(gy, gm, gd).isoformat()
 
 
 def format_jalali_date(dt: datetime | None, tz_name: str) -> str:
     if dt is None:
         return "-"
     local = dt.astimezone(_get_tz(tz_name))
-    j = gregorian_to_jalali(local.year, local.month, local.day)
-    return j.isoformat()
+    return _jalali_date_str(local.year, local.month, local.day)
 
 
 def format_jalali_datetime(dt: datetime | None, tz_name: str) -> str:
     if dt is None:
         return "-"
     local = dt.astimezone(_get_tz(tz_name))
-    j = gregorian_to_jalali(local.year, local.month, local.day)
-    return f"{j.isoformat()} {local.strftime('%H:%M:%S')}"
+    return f"{_jalali_date_str(local.year, local.month, local.day)} {local.strftime('%H:%M:%S')}"
 
 
 _PERSIAN_DIGITS = str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹")
 
 
+_PERIODS = (
+    ("بامداد",) * 4  # 00-03
+    + ("صبح",) * 8  # 04-11
+    + ("ظهر",)  # 12
+    + ("بعدازظهر",) * 4  # 13-16
+    + ("عصر",) * 3  # 17-19
+    + ("شب",) * 4  # 20-23
+)
+_PERSIAN_HOURS = tuple(str(h % 12 or 12).translate(_PERSIAN_DIGITS) for h in range(24))
+_PERSIAN_MINUTES = tuple(f"{m:02d}".translate(_PERSIAN_DIGITS) for m in range(60))
+
+
+@functools.lru_cache(maxsize=2048)
+def _persian_time_str(hour: int, minute: int) -> str:
+    # Only 24 * 60 distinct outputs exist, so each is built once.
+    return f"ساعت {_PERSIAN_HOURS[hour]}.{_PERSIAN_MINUTES[minute]} {_PERIODS[hour]}"
+
+
 def format_tehran_hour(dt: datetime | None, tz_name: str) -> str:
     if dt is None:
         return "-"
     local = dt.astimezone(_get_tz(tz_name))
-    hour = int(local.hour)
-    hour12 = hour % 12
-    if hour12 == 0:
-        hour12 = 12
-    minute = int(local.minute)
-
-    if 0 <= hour <= 3:
-        period = "بامداد"
-    elif 4 <= hour <= 11:
-        period = "صبح"
-    elif hour == 12:
-        period = "ظهر"
-    elif 13 <= hour <= 16:
-        period = "بعدازظهر"
-    elif 17 <= hour <= 19:
-        period = "عصر"
-    else:
-        period = "شب"
-
-    hour_str = str(hour12).translate(_PERSIAN_DIGITS)
-    minute_str = str(minute).rjust(2, "0").translate(_PERSIAN_DIGITS)
-    return f"ساعت {hour_str}.{minute_str} {period}"
+    return _persian_time_str(local.hour, local.minute)
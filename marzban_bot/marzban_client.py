@@ -1,15 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import functools
+import importlib.util
+import json
+from collections.abc import Awaitable, Callable
 from typing import Any
 from urllib.parse import urlparse, urlunparse
 
 import httpx
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
 
 class MarzbanApiError(RuntimeError):
     pass
 
 
+# Shared by every outbound AsyncClient so keepalive sockets are reused across scheduler ticks.
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40, keepalive_expiry=60.0)
+# httpx only speaks HTTP/2 when the optional h2 package is installed.
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+
+
+@functools.lru_cache(maxsize=64)
 def normalize_marzban_base_url(raw: str) -> str:
     raw = (raw or "").strip()
     if not raw:
@@ -37,6 +55,23 @@ def normalize_marzban_base_url(raw: str) -> str:
     return urlunparse((parsed.scheme, parsed.netloc, path, "", "", "")).rstrip("/")
 
 
+def _json(resp: httpx.Response) -> Any:
+    # /api/users pages can be hundreds of KB; orjson parses the raw bytes without decoding to str.
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+
+def token_expiry(token: str) -> int | None:
+    """Return the ``exp`` claim of a Marzban JWT access token, without verifying it."""
+    try:
+        payload_b64 = token.split(".")[1]
+        payload = json.loads(base64.urlsafe_b64decode(payload_b64 + "=" * (-len(payload_b64) % 4)))
+        return int(payload["exp"])
+    except Exception:
+        return None
+
+
 class MarzbanClient:
     def __init__(
         self,
@@ -46,52 +81,85 @@ class MarzbanClient:
         password: str,
         verify_ssl: bool = True,
         timeout_seconds: float = 30.0,
+        http_client: httpx.AsyncClient | None = None,
+        on_login: Callable[[str], Awaitable[None]] | None = None,
     ) -> None:
+        """Pass ``http_client`` to borrow a shared pool; its verify setting must match ``verify_ssl``.
+
+        ``on_login`` is awaited with every newly issued access token, including re-logins after a 401.
+        """
         normalized = normalize_marzban_base_url(base_url)
         if not normalized:
             raise ValueError("Invalid base_url (expected http(s) URL)")
         self._username = username
         self._password = password
         self._token: str | None = None
-        self._client = httpx.AsyncClient(
-            base_url=normalized,
+        self._login_lock = asyncio.Lock()
+        self._on_login = on_login
+        # Paths are joined here and auth is sent per request, so a borrowed client stays shareable.
+        self._base_url = normalized + "/"
+        self._headers: dict[str, str] = {}
+        self._owns_client = http_client is None
+        self._client = http_client or httpx.AsyncClient(
             timeout=httpx.Timeout(timeout_seconds),
             verify=verify_ssl,
+            limits=HTTP_LIMITS,
+            http2=HTTP2_ENABLED,
         )
 
     async def aclose(self) -> None:
-        await self._client.aclose()
+        if self._owns_client:
+            await self._client.aclose()
+
+    @property
+    def token(self) -> str | None:
+        return self._token
+
+    def set_token(self, token: str) -> None:
+        """Reuse a previously issued access token; a 401 still triggers a fresh login."""
+        self._token = token
+        self._headers["Authorization"] = f"Bearer {token}"
 
     async def login(self) -> str:
         resp = await self._client.post(
-            "api/admin/token",
+            self._base_url + "api/admin/token",
             data={"username": self._username, "password": self._password},
         )
         if resp.status_code == 401:
             raise MarzbanApiError("Unauthorized: check admin username/password")
         resp.raise_for_status()
-        data = resp.json()
+        data = _json(resp)
         token = data.get("access_token")
         if not token:
             raise MarzbanApiError("Login succeeded but access_token was missing")
-        self._token = token
-        self._client.headers["Authorization"] = f"Bearer {token}"
+        self.set_token(token)
+        if self._on_login is not None:
+            await self._on_login(token)
         return token
 
+    async def _refresh_token(self, stale: str | None) -> None:
+        # Single-flight: concurrent callers that saw the same (missing or rejected) token
+        # wait for one login instead of each posting to /api/admin/token.
+        async with self._login_lock:
+            if not self._token or self._token == stale:
+                await self.login()
+
     async def _request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
         path = (path or "").lstrip("/")
         if not self._token:
-            await self.login()
-        resp = await self._client.request(method, path, **kwargs)
+            await self._refresh_token(None)
+        token = self._token
+        url = self._base_url + path
+        resp = await self._client.request(method, url, headers=self._headers, **kwargs)
         if resp.status_code == 401:
-            await self.login()
-            resp = await self._client.request(method, path, **kwargs)
+            await self._refresh_token(token)
+            resp = await self._client.request(method, url, headers=self._headers, **kwargs)
         return resp
 
     async def get_inbounds(self) -> dict[str, list[str]]:
         resp = await self._request("GET", "api/inbounds")
         resp.raise_for_status()
-        data = resp.json()
+        data = _json(resp)
         if not isinstance(data, dict):
             raise MarzbanApiError("Unexpected /api/inbounds response")
         return {str(k): list(v) for k, v in data.items()}
@@ -108,28 +176,28 @@ class MarzbanClient:
             params["search"] = search
         resp = await self._request("GET", "api/users", params=params)
         resp.raise_for_status()
-        return resp.json()
+        return _json(resp)
 
     async def get_user(self, username: str) -> dict[str, Any]:
         resp = await self._request("GET", f"api/user/{username}")
         if resp.status_code == 404:
             raise MarzbanApiError(f"User not found: {username}")
         resp.raise_for_status()
-        return resp.json()
+        return _json(resp)
 
     async def revoke_user_subscription(self, username: str) -> dict[str, Any]:
         resp = await self._request("POST", f"api/user/{username}/revoke_sub")
         if resp.status_code == 404:
             raise MarzbanApiError(f"User not found: {username}")
         resp.raise_for_status()
-        return resp.json()
+        return _json(resp)
 
     async def reset_user_data_usage(self, username: str) -> dict[str, Any]:
         resp = await self._request("POST", f"api/user/{username}/reset")
         if resp.status_code == 404:
             raise MarzbanApiError(f"User not found: {username}")
         resp.raise_for_status()
-        return resp.json()
+        return _json(resp)
 
     async def get_user_usage(
         self,
@@ -143,4 +211,4 @@ class MarzbanClient:
         if resp.status_code == 404:
             raise MarzbanApiError(f"User not found: {username}")
         resp.raise_for_status()
-        return resp.json()
+        return _json(resp)
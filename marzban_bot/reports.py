@@ -28,6 +28,7 @@ def build_report_message(
     next_reset_at: datetime | None,
     interval_hours: int | None,
     reason: str,
+    now_str: str | None = None,
 ) -> str:
     username = str(user.get("username", "-"))
     status = str(user.get("status", "-"))
@@ -51,7 +52,7 @@ def build_report_message(
 
     lines = [
         f"Reason: {reason}",
-        f"Time: {format_dt(now, tz_name)}",
+        f"Time: {now_str or format_dt(now, tz_name)}",
         f"Username: {username}",
         f"Status: {status}",
         f"Traffic: {traffic_line}",
@@ -69,10 +70,10 @@ def build_report_message(
         usages = usage.get("usages") or []
         if usages:
             lines.append("Node usage:")
-            for item in usages[:10]:
-                node = str(item.get("node_name", "-"))
-                node_used = _safe_int(item.get("used_traffic")) or 0
-                lines.append(f"- {node}: {format_bytes(node_used)}")
+            lines.extend(
+                f"- {item.get('node_name', '-')!s}: {format_bytes(_safe_int(item.get('used_traffic')) or 0)}"
+                for item in usages[:10]
+            )
 
     return "\n".join(lines)
 
@@ -84,21 +85,33 @@ def build_links_document(
     tz_name: str,
     now: datetime,
     next_reset_at: datetime | None,
+    now_str: str | None = None,
 ) -> InputFile:
     username = str(user.get("username", "user"))
     subscription_url = str(user.get("subscription_url", "")).strip()
 
     header_lines = [
         f"username={username}",
-        f"generated_at={format_dt(now, tz_name)}",
+        f"generated_at={now_str or format_dt(now, tz_name)}",
     ]
     if next_reset_at is not None:
         header_lines.append(f"next_reset_at={format_dt(next_reset_at, tz_name)}")
     if subscription_url:
         header_lines.append(f"subscription_url={subscription_url}")
 
-    content = "\n".join(header_lines) + "\n\n" + "\n".join(resolved_links) + "\n"
-    bio = io.BytesIO(content.encode("utf-8"))
+    # Write line by line so large link lists are never materialized as one str and then encoded.
+    bio = io.BytesIO()
+    write = bio.write
+    for line in header_lines:
+        write(line.encode("utf-8"))
+        write(b"\n")
+    write(b"\n")
+    for link in resolved_links:
+        write(link.encode("utf-8"))
+        write(b"\n")
+    if not resolved_links:
+        write(b"\n")
+    bio.seek(0)
     bio.name = f"configs_{username}.txt"
     return InputFile(bio)
 
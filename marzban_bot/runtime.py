@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
 
 import httpx
 
-from .db import Database
+from .db import Database, Schedule
 from .marzban_client import MarzbanClient
 from .settings import Settings
 
@@ -17,4 +18,17 @@ class Runtime:
     marzban: MarzbanClient
     public_http: httpx.AsyncClient
     locks: dict[str, asyncio.Lock]
+    # Short-TTL caches keyed by username: (monotonic timestamp, value).
+    user_cache: dict[str, tuple[float, dict[str, Any]]] = field(default_factory=dict)
+    schedule_cache: dict[str, tuple[float, Schedule | None]] = field(default_factory=dict)
+    # Rendered /inbounds reply and when it was built; inbounds change rarely.
+    inbounds_text: tuple[float, str] | None = None
+    # Bounded hand-off from command handlers to the report workers (backpressure under bursts).
+    report_queue: asyncio.Queue[tuple[Any, Any, dict[str, Any], str]] | None = None
+    # In-flight lookups keyed by e.g. "user:<name>", shared by concurrent identical commands.
+    inflight: dict[str, asyncio.Future[Any]] = field(default_factory=dict)
+
+    def forget_user(self, username: str) -> None:
+        self.user_cache.pop(username, None)
+        self.schedule_cache.pop(username, None)
 
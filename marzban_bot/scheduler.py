@@ -9,6 +9,7 @@ import httpx
 from telegram import Bot
 
 from .db import Schedule
+from .formatting import format_dt, utf16_len
 from .reports import (
     build_links_document,
     build_report_message,
@@ -17,6 +18,9 @@ from .reports import (
 )
 from .runtime import Runtime
 
+_MAX_CONCURRENT_SCHEDULES = 8
+_CAPTION_LIMIT = 1024  # Telegram's limit for document captions
+
 
 async def _fetch_subscription_payload(
     *,
@@ -33,13 +37,18 @@ async def _fetch_subscription_payload(
         return None
 
 
-async def _send_report(
+async def send_report(
     *,
     bot: Bot,
     chat_id: int,
     message: str,
     document,
 ) -> None:
+    # One Bot API call when the report fits as the document caption; Telegram counts the
+    # caption limit in UTF-16 code units, so emoji take two.
+    if document is not None and utf16_len(message) <= _CAPTION_LIMIT:
+        await bot.send_document(chat_id=chat_id, document=document, caption=message)
+        return
     await bot.send_message(chat_id=chat_id, text=message)
     if document is not None:
         await bot.send_document(chat_id=chat_id, document=document)
@@ -72,8 +81,21 @@ async def _get_target_chat_id(runtime: Runtime, username: str) -> int | None:
 async def run_due_schedules(bot: Bot, runtime: Runtime) -> None:
     now_epoch = int(time.time())
     due = await runtime.db.get_due_schedules(now=now_epoch)
-    for sched in due:
-        await _run_single_schedule(bot=bot, runtime=runtime, sched=sched, now_epoch=now_epoch)
+    if not due:
+        return
+    # Schedules are independent network round-trips; overlap them but cap upstream pressure.
+    # Same-username overlap is still prevented by the per-username lock.
+    sem = asyncio.Semaphore(_MAX_CONCURRENT_SCHEDULES)
+
+    async def _guarded(sched: Schedule) -> None:
+        async with sem:
+            try:
+                await _run_single_schedule(bot=bot, runtime=runtime, sched=sched, now_epoch=now_epoch)
+            finally:
+                # The run revokes the subscription and reschedules; drop the command-side caches.
+                runtime.forget_user(sched.username)
+
+    await asyncio.gather(*(_guarded(sched) for sched in due), return_exceptions=True)
 
 
 async def _run_single_schedule(*, bot: Bot, runtime: Runtime, sched: Schedule, now_epoch: int) -> None:
@@ -103,6 +125,8 @@ async def _run_single_schedule(*, bot: Bot, runtime: Runtime, sched: Schedule, n
             usage = await runtime.marzban.get_user_usage(username)
             now_dt = datetime.now(tz=UTC)
             next_reset_dt = datetime.fromtimestamp(next_run_epoch, tz=UTC)
+            # Shared by the message and the document so it is formatted once.
+            now_str = format_dt(now_dt, runtime.settings.timezone)
             message = build_report_message(
                 user=user,
                 usage=usage,
@@ -111,6 +135,7 @@ async def _run_single_schedule(*, bot: Bot, runtime: Runtime, sched: Schedule, n
                 next_reset_at=next_reset_dt,
                 interval_hours=interval_hours,
                 reason="scheduled revoke_sub",
+                now_str=now_str,
             )
 
             links = await _resolve_links(runtime, user)
@@ -120,8 +145,9 @@ async def _run_single_schedule(*, bot: Bot, runtime: Runtime, sched: Schedule, n
                 tz_name=runtime.settings.timezone,
                 now=now_dt,
                 next_reset_at=next_reset_dt,
+                now_str=now_str,
             )
-            await _send_report(bot=bot, chat_id=chat_id, message=message, document=doc)
+            await send_report(bot=bot, chat_id=chat_id, message=message, document=doc)
 
             await runtime.db.mark_schedule_result(
                 username=username,
@@ -143,6 +169,6 @@ async def scheduler_loop(bot: Bot, runtime: Runtime) -> None:
     try:
         while True:
             await run_due_schedules(bot, runtime)
-            await asyncio.sleep(max(5, int(runtime.settings.poll_interval_seconds)))
+            await runtime.db.sleep_until_next_due(runtime.settings.poll_interval_seconds)
     except asyncio.CancelledError:
         raise
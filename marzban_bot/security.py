@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import base64
+import functools
 import hashlib
 import hmac
 import os
@@ -8,19 +9,58 @@ import os
 from cryptography.fernet import Fernet, InvalidToken
 
 
-def hash_password(password: str, *, iterations: int = 210_000) -> str:
+# scrypt is cheaper per login than 210k PBKDF2 rounds at comparable strength; it is only
+# missing when Python is linked against a pre-1.1 OpenSSL.
+_HAS_SCRYPT = hasattr(hashlib, "scrypt")
+_SCRYPT_N = 2**14
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def hash_password(password: str, *, iterations: int = 210_000, algo: str | None = None) -> str:
     if not password:
         raise ValueError("Password is empty")
+    if algo is None:
+        algo = "scrypt" if _HAS_SCRYPT else "pbkdf2_sha256"
     salt = os.urandom(16)
+    if algo == "scrypt":
+        dk = hashlib.scrypt(
+            password.encode("utf-8"), salt=salt, n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P, dklen=32
+        )
+        return "scrypt$%d$%d$%d$%s$%s" % (_SCRYPT_N, _SCRYPT_R, _SCRYPT_P, _b64(salt), _b64(dk))
+    if algo != "pbkdf2_sha256":
+        raise ValueError(f"Unsupported password hash algorithm: {algo}")
     dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
-    return "pbkdf2_sha256$%d$%s$%s" % (
-        iterations,
-        base64.urlsafe_b64encode(salt).decode("ascii").rstrip("="),
-        base64.urlsafe_b64encode(dk).decode("ascii").rstrip("="),
-    )
+    return "pbkdf2_sha256$%d$%s$%s" % (iterations, _b64(salt), _b64(dk))
+
+
+def _verify_scrypt(password: str, stored_hash: str) -> bool:
+    try:
+        _, n_raw, r_raw, p_raw, salt_b64, dk_b64 = stored_hash.split("$", 5)
+        n, r, p = int(n_raw), int(r_raw), int(p_raw)
+        salt = base64.urlsafe_b64decode(salt_b64 + "==")
+        expected = base64.urlsafe_b64decode(dk_b64 + "==")
+        dk = hashlib.scrypt(
+            password.encode("utf-8"),
+            salt=salt,
+            n=n,
+            r=r,
+            p=p,
+            dklen=len(expected),
+            maxmem=2 * 128 * r * (n + p + 2),
+        )
+    except Exception:
+        return False
+    return hmac.compare_digest(dk, expected)
 
 
 def verify_password(password: str, stored_hash: str) -> bool:
+    if stored_hash.startswith("scrypt$"):
+        return _verify_scrypt(password, stored_hash)
     try:
         algo, iterations_raw, salt_b64, dk_b64 = stored_hash.split("$", 3)
     except ValueError:
@@ -38,21 +78,22 @@ def verify_password(password: str, stored_hash: str) -> bool:
     return hmac.compare_digest(dk, expected)
 
 
-def _derive_fernet_key(secret: str) -> bytes:
+@functools.lru_cache(maxsize=4)
+def _fernet_for(secret: str) -> Fernet:
+    # APP_SECRET_KEY is process-wide, so derive the key and build Fernet's subkeys once.
     if not secret:
         raise ValueError("APP_SECRET_KEY is required for encryption")
     digest = hashlib.sha256(secret.encode("utf-8")).digest()
-    return base64.urlsafe_b64encode(digest)
+    return Fernet(base64.urlsafe_b64encode(digest))
 
 
 def encrypt_text(secret: str, plaintext: str) -> str:
-    f = Fernet(_derive_fernet_key(secret))
-    token = f.encrypt(plaintext.encode("utf-8"))
+    token = _fernet_for(secret).encrypt(plaintext.encode("utf-8"))
     return token.decode("ascii")
 
 
 def decrypt_text(secret: str, token: str) -> str:
-    f = Fernet(_derive_fernet_key(secret))
+    f = _fernet_for(secret)
     try:
         raw = f.decrypt(token.encode("ascii"))
     except InvalidToken as e:
@@ -14,27 +14,39 @@ _URI_SCHEMES = (
     "tuic://",
     "wireguard://",
 )
+# One scan over the payload instead of a substring search per scheme.
+_URI_RE = re.compile("|".join(map(re.escape, _URI_SCHEMES)))
 
 
-_BASE64_RE = re.compile(r"^[A-Za-z0-9+/_-]+={0,2}$")
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/_-]+={0,2}")
+# Subscription payloads are a few hundred KB at most; don't regex-scan anything pathological.
+_MAX_BASE64_CHARS = 4 * 1024 * 1024
+_WS_DELETE = str.maketrans("", "", " \t\r\n\v\f")
 
 
 def _maybe_base64_decode(text: str) -> str | None:
-    candidate = "".join(text.split())
-    if len(candidate) < 16 or not _BASE64_RE.match(candidate):
+    candidate = text.translate(_WS_DELETE)
+    # A base64 body can never be 1 char past a multiple of 4; reject before the regex scan.
+    size = len(candidate)
+    if size < 16 or size > _MAX_BASE64_CHARS or size % 4 == 1 or not _BASE64_RE.fullmatch(candidate):
         return None
 
-    padded = candidate + ("=" * (-len(candidate) % 4))
-    for decoder in (base64.b64decode, base64.urlsafe_b64decode):
-        try:
-            decoded = decoder(padded).decode("utf-8", errors="ignore")
-        except Exception:
-            continue
-        if any(s in decoded for s in _URI_SCHEMES) or "://" in decoded:
-            return decoded
+    padded = candidate + ("=" * (-size % 4))
+    # urlsafe_b64decode maps "-_" onto "+/" and leaves "+/" intact, so it decodes both alphabets.
+    try:
+        decoded = base64.urlsafe_b64decode(padded).decode("utf-8", errors="ignore")
+    except Exception:
+        return None
+    # Every known scheme contains "://", so this single check covers them all.
+    if "://" in decoded:
+        return decoded
     return None
 
 
+def _nonblank_lines(text: str) -> list[str]:
+    return [stripped for line in text.splitlines() if (stripped := line.strip())]
+
+
 def resolve_subscription_to_links(payload_text: str) -> list[str]:
     """
     Tries to "resolve" a subscription payload into individual config links.
@@ -48,12 +60,12 @@ def resolve_subscription_to_links(payload_text: str) -> list[str]:
     if not text:
         return []
 
-    if any(s in text for s in _URI_SCHEMES):
-        return [line.strip() for line in text.splitlines() if line.strip()]
+    if _URI_RE.search(text) is not None:
+        return _nonblank_lines(text)
 
     decoded = _maybe_base64_decode(text)
     if decoded:
-        return [line.strip() for line in decoded.splitlines() if line.strip()]
+        return _nonblank_lines(decoded)
 
     # Not a classic subscription list; return the raw text as a single "config".
     return [text]
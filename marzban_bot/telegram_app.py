@@ -1,37 +1,76 @@
 from __future__ import annotations
 
 import asyncio
+import functools
+import json
 import logging
 import time
 from datetime import UTC, datetime
+from collections.abc import Awaitable, Callable
 from typing import Any
 
 import httpx
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.ext import Application, CommandHandler, ContextTypes, filters
 
-from .db import Database
-from .formatting import format_bytes, format_dt, parse_epoch_seconds
-from .marzban_client import MarzbanApiError, MarzbanClient
+from .db import Database, Schedule
+from .formatting import format_bytes, format_dt, format_epoch, parse_epoch_seconds
+from .marzban_client import HTTP2_ENABLED, MarzbanApiError, MarzbanClient, token_expiry
 from .reports import build_links_document, build_report_message, resolve_links_from_api_user, resolve_links_from_subscription_payload
 from .runtime import Runtime
-from .scheduler import scheduler_loop
+from .scheduler import scheduler_loop, send_report
+from .security import decrypt_text, encrypt_text
 from .settings import Settings
 
 logger = logging.getLogger(__name__)
 
-
-def _is_admin(settings: Settings, update: Update) -> bool:
-    user = update.effective_user
-    return bool(user and user.id in settings.telegram_admin_user_ids)
-
-
-async def _require_admin(settings: Settings, update: Update) -> bool:
-    if _is_admin(settings, update):
-        return True
+# Panel users and schedules change far less often than admins re-run commands on them.
+_CACHE_TTL_SECONDS = 15.0
+_MAX_CONCURRENT_PAGES = 8
+_INBOUNDS_TTL_SECONDS = 60.0
+_REPORT_QUEUE_SIZE = 256
+_REPORT_WORKERS = 4
+_MAX_SUBSCRIPTION_BYTES = 2 * 1024 * 1024
+_MARZBAN_TOKEN_KEY = "marzban_token"
+_PUBLIC_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=60.0)
+
+# Static replies, built once at import.
+_HELP_TEXT = (
+    "Commands:\n"
+    "/whoami - show user_id/chat_id\n"
+    "/users [search] - list users\n"
+    "/user <username> - user info + schedule\n"
+    "/links <username> - send links + usage report\n"
+    "/revoke <username> - revoke_sub (reset sub token) + send new links\n"
+    "/schedule <username> <hours> - auto revoke every N hours\n"
+    "/schedule_all <hours> [search] - schedule all users\n"
+    "/unschedule <username> - disable schedule\n"
+    "/bind <username> [chat_id] - where to send scheduled reports\n"
+    "/unbind <username> - remove binding\n"
+    "/inbounds - list panel inbounds\n"
+    "/status [username] - schedule status\n"
+)
+_NOT_AUTHORIZED = "Not authorized."
+_NO_USERS_FOUND = "No users found."
+_USAGE_USER = "Usage: /user <username>"
+_UNHANDLED_ERROR = "Unhandled error. Check logs."
+_USAGE_LINKS = "Usage: /links <username>"
+_USAGE_REVOKE = "Usage: /revoke <username>"
+_USAGE_SCHEDULE = "Usage: /schedule <username> <hours>"
+_HOURS_NOT_INT = "hours must be an integer"
+_HOURS_NOT_POSITIVE = "hours must be > 0"
+_USAGE_SCHEDULE_ALL = "Usage: /schedule_all <hours> [search]"
+_USAGE_UNSCHEDULE = "Usage: /unschedule <username>"
+_USAGE_BIND = "Usage: /bind <username> [chat_id]"
+_CHAT_ID_NOT_INT = "chat_id must be an integer"
+_USAGE_UNBIND = "Usage: /unbind <username>"
+_NO_SCHEDULE = "No schedule."
+_NO_SCHEDULES = "No schedules."
+
+
+async def _reply_not_authorized(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if update.effective_message:
-        await update.effective_message.reply_text("Not authorized.")
-    return False
+        await update.effective_message.reply_text(_NOT_AUTHORIZED)
 
 
 def _runtime(context: ContextTypes.DEFAULT_TYPE) -> Runtime:
@@ -41,6 +80,76 @@ def _runtime(context: ContextTypes.DEFAULT_TYPE) -> Runtime:
     return rt
 
 
+def _arg_username(raw: str) -> str:
+    return raw.strip()
+
+
+def _arg_hours(raw: str) -> int:
+    try:
+        hours = int(raw)
+    except ValueError:
+        raise ValueError(_HOURS_NOT_INT) from None
+    if hours <= 0:
+        raise ValueError(_HOURS_NOT_POSITIVE)
+    return hours
+
+
+def _with_args(usage: str, *converters: Callable[[str], Any]):
+    """Parse the leading command args once and pass them to the handler as positionals.
+
+    Replies with ``usage`` when args are missing, or with the converter's ValueError text.
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            message = update.effective_message
+            if not message:
+                return
+            args = context.args or []
+            if len(args) < len(converters):
+                await message.reply_text(usage)
+                return
+            try:
+                parsed = [convert(raw) for convert, raw in zip(converters, args)]
+            except ValueError as e:
+                await message.reply_text(str(e))
+                return
+            await handler(update, context, *parsed)
+
+        return wrapper
+
+    return decorator
+
+
+async def _once(rt: Runtime, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    # Coalesce: a caller arriving while the same lookup is in flight awaits that result.
+    task = rt.inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        rt.inflight[key] = task
+        task.add_done_callback(lambda _: rt.inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _get_user_cached(rt: Runtime, username: str) -> dict[str, Any]:
+    hit = rt.user_cache.get(username)
+    if hit is not None and time.monotonic() - hit[0] < _CACHE_TTL_SECONDS:
+        return hit[1]
+    user = await _once(rt, f"user:{username}", lambda: rt.marzban.get_user(username))
+    rt.user_cache[username] = (time.monotonic(), user)
+    return user
+
+
+async def _get_schedule_cached(rt: Runtime, username: str) -> Schedule | None:
+    hit = rt.schedule_cache.get(username)
+    if hit is not None and time.monotonic() - hit[0] < _CACHE_TTL_SECONDS:
+        return hit[1]
+    sched = await rt.db.get_schedule(username=username)
+    rt.schedule_cache[username] = (time.monotonic(), sched)
+    return sched
+
+
 async def cmd_whoami(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     chat = update.effective_chat
@@ -53,10 +162,6 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not (update.effective_chat and update.effective_message):
         return
 
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-
     rt = _runtime(context)
     await rt.db.set_kv("default_chat_id", str(update.effective_chat.id))
     await update.effective_message.reply_text(
@@ -67,42 +172,24 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.effective_message:
         return
-    text = (
-        "Commands:\n"
-        "/whoami - show user_id/chat_id\n"
-        "/users [search] - list users\n"
-        "/user <username> - user info + schedule\n"
-        "/links <username> - send links + usage report\n"
-        "/revoke <username> - revoke_sub (reset sub token) + send new links\n"
-        "/schedule <username> <hours> - auto revoke every N hours\n"
-        "/schedule_all <hours> [search] - schedule all users\n"
-        "/unschedule <username> - disable schedule\n"
-        "/bind <username> [chat_id] - where to send scheduled reports\n"
-        "/unbind <username> - remove binding\n"
-        "/inbounds - list panel inbounds\n"
-        "/status [username] - schedule status\n"
-    )
-    await update.effective_message.reply_text(text)
+    await update.effective_message.reply_text(_HELP_TEXT)
 
 
 async def cmd_inbounds(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
     if not update.effective_message:
         return
     rt = _runtime(context)
-    data = await rt.marzban.get_inbounds()
-    lines = []
-    for proto, tags in sorted(data.items()):
-        lines.append(f"{proto}: {', '.join(tags) if tags else '-'}")
-    await update.effective_message.reply_text("\n".join(lines) or "-")
+    cached = rt.inbounds_text
+    if cached is not None and time.monotonic() - cached[0] < _INBOUNDS_TTL_SECONDS:
+        text = cached[1]
+    else:
+        data = await rt.marzban.get_inbounds()
+        text = "\n".join(f"{proto}: {', '.join(tags) if tags else '-'}" for proto, tags in sorted(data.items())) or "-"
+        rt.inbounds_text = (time.monotonic(), text)
+    await update.effective_message.reply_text(text)
 
 
 async def cmd_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
     if not update.effective_message:
         return
     rt = _runtime(context)
@@ -110,26 +197,17 @@ async def cmd_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     data = await rt.marzban.get_users(limit=30, search=search)
     users = data.get("users") if isinstance(data, dict) else None
     if not isinstance(users, list) or not users:
-        await update.effective_message.reply_text("No users found.")
+        await update.effective_message.reply_text(_NO_USERS_FOUND)
         return
     names = [str(u.get("username", "-")) for u in users]
     await update.effective_message.reply_text("\n".join(names[:30]))
 
 
-async def cmd_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_message:
-        return
-    if not context.args:
-        await update.effective_message.reply_text("Usage: /user <username>")
-        return
-
+@_with_args(_USAGE_USER, _arg_username)
+async def cmd_user(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str) -> None:
     rt = _runtime(context)
-    username = context.args[0].strip()
-    user = await rt.marzban.get_user(username)
-    sched = await rt.db.get_schedule(username=username)
+    user = await _get_user_cached(rt, username)
+    sched = await _get_schedule_cached(rt, username)
 
     used = int(user.get("used_traffic") or 0)
     expire_dt = parse_epoch_seconds(user.get("expire"))
@@ -147,15 +225,16 @@ async def cmd_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     inbounds = user.get("inbounds")
     if isinstance(inbounds, dict) and inbounds:
         lines.append("Inbounds:")
-        for proto, tags in sorted(inbounds.items()):
-            if isinstance(tags, list):
-                lines.append(f"- {proto}: {', '.join(map(str, tags)) if tags else '-'}")
+        lines.extend(
+            f"- {proto}: {', '.join(map(str, tags)) if tags else '-'}"
+            for proto, tags in sorted(inbounds.items())
+            if isinstance(tags, list)
+        )
     if sched is None:
         lines.append("Schedule: -")
     else:
-        next_dt = datetime.fromtimestamp(int(sched.next_run_at), tz=UTC)
         lines.append(
-            f"Schedule: {'enabled' if sched.enabled else 'disabled'}; every {sched.interval_hours}h; next {format_dt(next_dt, rt.settings.timezone)}"
+            f"Schedule: {'enabled' if sched.enabled else 'disabled'}; every {sched.interval_hours}h; next {format_epoch(int(sched.next_run_at), rt.settings.timezone)}"
         )
         if sched.last_error:
             lines.append(f"Last error: {sched.last_error}")
@@ -168,9 +247,17 @@ async def _fetch_subscription_payload(rt: Runtime, url: str) -> str | None:
     if not url:
         return None
     try:
-        resp = await rt.public_http.get(url)
-        resp.raise_for_status()
-        return resp.text
+        # Stream into one buffer with a size cap instead of letting httpx buffer the body and
+        # then build .text (with charset sniffing) from it.
+        async with rt.public_http.stream("GET", url) as resp:
+            resp.raise_for_status()
+            body = bytearray()
+            async for chunk in resp.aiter_bytes():
+                body += chunk
+                if len(body) > _MAX_SUBSCRIPTION_BYTES:
+                    # A truncated payload can't be base64-decoded; fall back to the API links.
+                    return None
+            return body.decode(resp.encoding or "utf-8", errors="replace")
     except Exception:
         return None
 
@@ -185,6 +272,19 @@ async def _resolve_links(rt: Runtime, user: dict[str, Any]) -> list[str]:
     return api_links
 
 
+async def _report_schedule(rt: Runtime, username: str) -> Schedule | None:
+    if not username:
+        return None
+    return await _get_schedule_cached(rt, username)
+
+
+async def _safe_usage(rt: Runtime, username: str) -> dict[str, Any] | None:
+    try:
+        return await rt.marzban.get_user_usage(username)
+    except Exception:
+        return None
+
+
 async def _send_user_report_and_links(
     *,
     update: Update,
@@ -197,7 +297,13 @@ async def _send_user_report_and_links(
 
     rt = _runtime(context)
     username = str(user.get("username", "")).strip()
-    sched = await rt.db.get_schedule(username=username) if username else None
+    # Schedule lookup, usage and subscription fetch are independent round-trips.
+    sched, usage, links = await asyncio.gather(
+        _report_schedule(rt, username),
+        _safe_usage(rt, username),
+        # The subscription URL is part of the key so a revoke (new URL) never reuses a stale fetch.
+        _once(rt, f"links:{username}:{user.get('subscription_url', '')}", lambda: _resolve_links(rt, user)),
+    )
 
     interval_hours = None
     next_reset_dt = None
@@ -205,13 +311,8 @@ async def _send_user_report_and_links(
         interval_hours = int(sched.interval_hours)
         next_reset_dt = datetime.fromtimestamp(int(sched.next_run_at), tz=UTC)
 
-    usage = None
-    try:
-        usage = await rt.marzban.get_user_usage(username)
-    except Exception:
-        usage = None
-
     now_dt = datetime.now(tz=UTC)
+    now_str = format_dt(now_dt, rt.settings.timezone)
     message = build_report_message(
         user=user,
         usage=usage,
@@ -220,175 +321,163 @@ async def _send_user_report_and_links(
         next_reset_at=next_reset_dt,
         interval_hours=interval_hours,
         reason=reason,
+        now_str=now_str,
     )
-
-    links = await _resolve_links(rt, user)
-    doc = build_links_document(
+    # Encoding hundreds of links is CPU work; keep it off the event loop.
+    doc = await asyncio.to_thread(
+        build_links_document,
         user=user,
         resolved_links=links,
         tz_name=rt.settings.timezone,
         now=now_dt,
         next_reset_at=next_reset_dt,
+        now_str=now_str,
     )
 
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=message)
-    await context.bot.send_document(chat_id=update.effective_chat.id, document=doc)
+    await send_report(bot=context.bot, chat_id=update.effective_chat.id, message=message, document=doc)
 
 
-async def cmd_links(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_message:
-        return
-    if not context.args:
-        await update.effective_message.reply_text("Usage: /links <username>")
-        return
-    rt = _runtime(context)
-    username = context.args[0].strip()
-    user = await rt.marzban.get_user(username)
-    await _send_user_report_and_links(update=update, context=context, user=user, reason="links requested")
+async def _report_worker(queue: asyncio.Queue) -> None:
+    while True:
+        update, context, user, reason = await queue.get()
+        try:
+            await _send_user_report_and_links(update=update, context=context, user=user, reason=reason)
+        except Exception:
+            logger.exception("report delivery failed")
+            if update.effective_message:
+                try:
+                    await update.effective_message.reply_text(_UNHANDLED_ERROR)
+                except Exception:
+                    pass
+        finally:
+            queue.task_done()
 
 
-async def cmd_revoke(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_message:
-        return
-    if not context.args:
-        await update.effective_message.reply_text("Usage: /revoke <username>")
+async def _enqueue_report(
+    *,
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    user: dict[str, Any],
+    reason: str,
+) -> None:
+    rt = _runtime(context)
+    if rt.report_queue is None:
+        await _send_user_report_and_links(update=update, context=context, user=user, reason=reason)
         return
+    await rt.report_queue.put((update, context, user, reason))
 
+
+@_with_args(_USAGE_LINKS, _arg_username)
+async def cmd_links(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str) -> None:
+    rt = _runtime(context)
+    user = await _get_user_cached(rt, username)
+    await _enqueue_report(update=update, context=context, user=user, reason="links requested")
+
+
+@_with_args(_USAGE_REVOKE, _arg_username)
+async def cmd_revoke(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str) -> None:
     rt = _runtime(context)
-    username = context.args[0].strip()
     user = await rt.marzban.revoke_user_subscription(username)
+    rt.forget_user(username)
 
     # If a schedule exists, keep the cadence from "now".
     sched = await rt.db.get_schedule(username=username)
     if sched and sched.enabled:
-        next_run = int(time.time()) + int(sched.interval_hours) * 3600
+        now = time.time_ns() // 1_000_000_000
         await rt.db.mark_schedule_result(
             username=username,
-            next_run_at=next_run,
-            last_run_at=int(time.time()),
+            next_run_at=now + int(sched.interval_hours) * 3600,
+            last_run_at=now,
             last_error=None,
         )
+        rt.schedule_cache.pop(username, None)
 
-    await _send_user_report_and_links(update=update, context=context, user=user, reason="manual revoke_sub")
-
+    await _enqueue_report(update=update, context=context, user=user, reason="manual revoke_sub")
 
-async def cmd_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_message:
-        return
-    if len(context.args) < 2:
-        await update.effective_message.reply_text("Usage: /schedule <username> <hours>")
-        return
 
+@_with_args(_USAGE_SCHEDULE, _arg_username, _arg_hours)
+async def cmd_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str, hours: int) -> None:
     rt = _runtime(context)
-    username = context.args[0].strip()
-    try:
-        hours = int(context.args[1])
-    except ValueError:
-        await update.effective_message.reply_text("hours must be an integer")
-        return
-    if hours <= 0:
-        await update.effective_message.reply_text("hours must be > 0")
-        return
-
-    next_run_at = int(time.time()) + hours * 3600
+    next_run_at = time.time_ns() // 1_000_000_000 + hours * 3600
     await rt.db.set_schedule(username=username, interval_hours=hours, next_run_at=next_run_at, enabled=True)
+    rt.schedule_cache.pop(username, None)
 
-    next_dt = datetime.fromtimestamp(next_run_at, tz=UTC)
     await update.effective_message.reply_text(
-        f"Scheduled {username} every {hours}h. Next: {format_dt(next_dt, rt.settings.timezone)}"
+        f"Scheduled {username} every {hours}h. Next: {format_epoch(next_run_at, rt.settings.timezone)}"
     )
 
 
-async def cmd_schedule_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_message:
-        return
-    if not context.args:
-        await update.effective_message.reply_text("Usage: /schedule_all <hours> [search]")
-        return
-
+@_with_args(_USAGE_SCHEDULE_ALL, _arg_hours)
+async def cmd_schedule_all(update: Update, context: ContextTypes.DEFAULT_TYPE, hours: int) -> None:
     rt = _runtime(context)
-    try:
-        hours = int(context.args[0])
-    except ValueError:
-        await update.effective_message.reply_text("hours must be an integer")
-        return
-    if hours <= 0:
-        await update.effective_message.reply_text("hours must be > 0")
-        return
-
     search = " ".join(context.args[1:]).strip() or None
-    offset = 0
     limit = 100
-    next_run_at = int(time.time()) + hours * 3600
+    next_run_at = time.time_ns() // 1_000_000_000 + hours * 3600
     total_scheduled = 0
 
-    while True:
-        data = await rt.marzban.get_users(offset=offset, limit=limit, search=search)
+    async def _schedule_page(data: Any) -> int:
+        # Returns the page's user count so the sequential fallback can spot the last page.
+        nonlocal total_scheduled
         users = data.get("users") if isinstance(data, dict) else None
         if not isinstance(users, list) or not users:
-            break
-
-        for u in users:
-            username = str(u.get("username", "")).strip()
-            if not username:
-                continue
-            await rt.db.set_schedule(username=username, interval_hours=hours, next_run_at=next_run_at, enabled=True)
-            total_scheduled += 1
-
-        offset += limit
-        if len(users) < limit:
-            break
+            return 0
+        rows = [
+            (name, hours * 60, next_run_at, True)
+            for name in (str(u.get("username", "")).strip() for u in users)
+            if name
+        ]
+        await rt.db.set_schedule_bulk(rows)
+        for row in rows:
+            rt.schedule_cache.pop(row[0], None)
+        total_scheduled += len(rows)
+        return len(users)
+
+    # The first page reports the total, so the remaining pages can be fetched concurrently;
+    # the semaphore keeps the panel from seeing more than a handful at once.
+    first = await rt.marzban.get_users(offset=0, limit=limit, search=search)
+    total = first.get("total") if isinstance(first, dict) else None
+    count = await _schedule_page(first)
+    if isinstance(total, int):
+        sem = asyncio.Semaphore(_MAX_CONCURRENT_PAGES)
+
+        async def _page(offset: int) -> dict[str, Any]:
+            async with sem:
+                return await rt.marzban.get_users(offset=offset, limit=limit, search=search)
+
+        if total > limit:
+            for data in await asyncio.gather(*(_page(offset) for offset in range(limit, total, limit))):
+                await _schedule_page(data)
+    else:
+        # Older panels and some proxies omit "total"; walk pages until a short one instead.
+        offset = 0
+        while count >= limit:
+            offset += limit
+            count = await _schedule_page(await rt.marzban.get_users(offset=offset, limit=limit, search=search))
 
-    next_dt = datetime.fromtimestamp(next_run_at, tz=UTC)
     await update.effective_message.reply_text(
-        f"Scheduled {total_scheduled} users every {hours}h. Next: {format_dt(next_dt, rt.settings.timezone)}"
+        f"Scheduled {total_scheduled} users every {hours}h. Next: {format_epoch(next_run_at, rt.settings.timezone)}"
     )
 
 
-async def cmd_unschedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_message:
-        return
-    if not context.args:
-        await update.effective_message.reply_text("Usage: /unschedule <username>")
-        return
+@_with_args(_USAGE_UNSCHEDULE, _arg_username)
+async def cmd_unschedule(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str) -> None:
     rt = _runtime(context)
-    username = context.args[0].strip()
     await rt.db.disable_schedule(username=username)
+    rt.schedule_cache.pop(username, None)
     await update.effective_message.reply_text(f"Schedule disabled for {username}")
 
 
-async def cmd_bind(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_chat or not update.effective_message:
-        return
-    if not context.args:
-        await update.effective_message.reply_text("Usage: /bind <username> [chat_id]")
+@_with_args(_USAGE_BIND, _arg_username)
+async def cmd_bind(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str) -> None:
+    if not update.effective_chat:
         return
 
     rt = _runtime(context)
-    username = context.args[0].strip()
     if len(context.args) >= 2:
         try:
             chat_id = int(context.args[1])
         except ValueError:
-            await update.effective_message.reply_text("chat_id must be an integer")
+            await update.effective_message.reply_text(_CHAT_ID_NOT_INT)
             return
     else:
         chat_id = int(update.effective_chat.id)
@@ -397,40 +486,28 @@ async def cmd_bind(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.effective_message.reply_text(f"Bound {username} -> chat_id={chat_id}")
 
 
-async def cmd_unbind(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
-    if not update.effective_message:
-        return
-    if not context.args:
-        await update.effective_message.reply_text("Usage: /unbind <username>")
-        return
+@_with_args(_USAGE_UNBIND, _arg_username)
+async def cmd_unbind(update: Update, context: ContextTypes.DEFAULT_TYPE, username: str) -> None:
     rt = _runtime(context)
-    username = context.args[0].strip()
     await rt.db.delete_binding(username=username)
     await update.effective_message.reply_text(f"Unbound {username}")
 
 
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings: Settings = context.application.bot_data["settings"]
-    if not await _require_admin(settings, update):
-        return
     if not update.effective_message:
         return
     rt = _runtime(context)
     if context.args:
         username = context.args[0].strip()
-        sched = await rt.db.get_schedule(username=username)
+        sched = await _get_schedule_cached(rt, username)
         if sched is None:
-            await update.effective_message.reply_text("No schedule.")
+            await update.effective_message.reply_text(_NO_SCHEDULE)
             return
-        next_dt = datetime.fromtimestamp(int(sched.next_run_at), tz=UTC)
         text = (
             f"{username}\n"
             f"enabled={sched.enabled}\n"
             f"interval_hours={sched.interval_hours}\n"
-            f"next={format_dt(next_dt, rt.settings.timezone)}\n"
+            f"next={format_epoch(int(sched.next_run_at), rt.settings.timezone)}\n"
         )
         if sched.last_error:
             text += f"last_error={sched.last_error}\n"
@@ -439,15 +516,14 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
     schedules = await rt.db.list_schedules(limit=30)
     if not schedules:
-        await update.effective_message.reply_text("No schedules.")
+        await update.effective_message.reply_text(_NO_SCHEDULES)
         return
-    lines = []
-    for s in schedules:
-        next_dt = datetime.fromtimestamp(int(s.next_run_at), tz=UTC)
-        lines.append(
-            f"{s.username}: {'on' if s.enabled else 'off'}; {s.interval_hours}h; next {format_dt(next_dt, rt.settings.timezone)}"
-        )
-    await update.effective_message.reply_text("\n".join(lines))
+    tz_name = rt.settings.timezone
+    text = "\n".join(
+        f"{s.username}: {'on' if s.enabled else 'off'}; {s.interval_hours}h; next {format_epoch(int(s.next_run_at), tz_name)}"
+        for s in schedules
+    )
+    await update.effective_message.reply_text(text)
 
 
 async def _post_init(application: Application) -> None:
@@ -457,23 +533,75 @@ async def _post_init(application: Application) -> None:
     db = Database(settings.db_path)
     await db.connect()
 
+    async def save_token(token: str) -> None:
+        # Every login (startup or a re-login after a 401) is persisted, encrypted like the
+        # other stored credentials, so the next restart can skip the login round-trip.
+        exp = token_expiry(token)
+        if exp is None:
+            return
+        raw = json.dumps({"token": token, "exp": exp})
+        try:
+            await db.set_kv(_MARZBAN_TOKEN_KEY, encrypt_text(settings.app_secret_key, raw))
+        except Exception:
+            logger.exception("Failed to persist Marzban access token")
+
     marzban = MarzbanClient(
         base_url=settings.marzban_base_url,
         username=settings.marzban_admin_username,
         password=settings.marzban_admin_password,
         verify_ssl=settings.marzban_verify_ssl,
+        on_login=save_token,
+    )
+    # Reuse the last access token across restarts while it has a minute or more left.
+    cached_token = None
+    cached_exp = 0
+    stored_token = await db.get_kv(_MARZBAN_TOKEN_KEY)
+    if stored_token:
+        try:
+            parsed = json.loads(decrypt_text(settings.app_secret_key, stored_token))
+            cached_token = str(parsed["token"])
+            cached_exp = int(parsed["exp"])
+        except Exception:
+            cached_token = None
+    if cached_token and cached_exp - time.time_ns() // 1_000_000_000 > 60:
+        marzban.set_token(cached_token)
+    else:
+        await marzban.login()
+
+    # Subscription fetches fan out across many users at once, so this pool is wider than
+    # the per-panel one; HTTP/2 multiplexes them over a single connection per host.
+    public_http = httpx.AsyncClient(
+        timeout=httpx.Timeout(30.0),
+        verify=settings.marzban_verify_ssl,
+        limits=_PUBLIC_HTTP_LIMITS,
+        http2=HTTP2_ENABLED,
+        headers={"User-Agent": "marzban-bot"},
+    )
+    runtime = Runtime(
+        settings=settings,
+        db=db,
+        marzban=marzban,
+        public_http=public_http,
+        locks={},
+        report_queue=asyncio.Queue(maxsize=_REPORT_QUEUE_SIZE),
     )
-    await marzban.login()
-
-    public_http = httpx.AsyncClient(timeout=httpx.Timeout(30.0), verify=settings.marzban_verify_ssl)
-    runtime = Runtime(settings=settings, db=db, marzban=marzban, public_http=public_http, locks={})
     application.bot_data["runtime"] = runtime
+    application.bot_data["report_workers"] = [
+        application.create_task(_report_worker(runtime.report_queue)) for _ in range(_REPORT_WORKERS)
+    ]
 
     task = application.create_task(scheduler_loop(application.bot, runtime))
     application.bot_data["scheduler_task"] = task
 
 
 async def _post_shutdown(application: Application) -> None:
+    for worker in application.bot_data.get("report_workers") or []:
+        worker.cancel()
+        try:
+            await worker
+        except (asyncio.CancelledError, Exception):
+            pass
+
     task = application.bot_data.get("scheduler_task")
     if isinstance(task, asyncio.Task):
         task.cancel()
@@ -484,9 +612,13 @@ async def _post_shutdown(application: Application) -> None:
 
     runtime = application.bot_data.get("runtime")
     if isinstance(runtime, Runtime):
-        await runtime.public_http.aclose()
-        await runtime.marzban.aclose()
-        await runtime.db.aclose()
+        # Independent resources; close them concurrently.
+        await asyncio.gather(
+            runtime.public_http.aclose(),
+            runtime.marzban.aclose(),
+            runtime.db.aclose(),
+            return_exceptions=True,
+        )
 
 
 async def _error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -499,7 +631,7 @@ async def _error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) ->
 
     logger.exception("Unhandled error", exc_info=err)
     if isinstance(update, Update) and update.effective_message:
-        await update.effective_message.reply_text("Unhandled error. Check logs.")
+        await update.effective_message.reply_text(_UNHANDLED_ERROR)
 
 
 def build_application(settings: Settings) -> Application:
@@ -514,19 +646,28 @@ def build_application(settings: Settings) -> Application:
     )
     application.bot_data["settings"] = settings
 
-    application.add_handler(CommandHandler("start", cmd_start))
     application.add_handler(CommandHandler("help", cmd_help))
     application.add_handler(CommandHandler("whoami", cmd_whoami))
-    application.add_handler(CommandHandler("users", cmd_users))
-    application.add_handler(CommandHandler("user", cmd_user))
-    application.add_handler(CommandHandler("links", cmd_links))
-    application.add_handler(CommandHandler("revoke", cmd_revoke))
-    application.add_handler(CommandHandler("schedule", cmd_schedule))
-    application.add_handler(CommandHandler("schedule_all", cmd_schedule_all))
-    application.add_handler(CommandHandler("unschedule", cmd_unschedule))
-    application.add_handler(CommandHandler("bind", cmd_bind))
-    application.add_handler(CommandHandler("unbind", cmd_unbind))
-    application.add_handler(CommandHandler("inbounds", cmd_inbounds))
-    application.add_handler(CommandHandler("status", cmd_status))
+
+    # PTB rejects non-admin updates before dispatch; they fall through to the
+    # "Not authorized." handler registered after the admin commands.
+    admin_only = filters.User(user_id=frozenset(settings.telegram_admin_user_ids))
+    admin_commands = {
+        "start": cmd_start,
+        "users": cmd_users,
+        "user": cmd_user,
+        "links": cmd_links,
+        "revoke": cmd_revoke,
+        "schedule": cmd_schedule,
+        "schedule_all": cmd_schedule_all,
+        "unschedule": cmd_unschedule,
+        "bind": cmd_bind,
+        "unbind": cmd_unbind,
+        "inbounds": cmd_inbounds,
+        "status": cmd_status,
+    }
+    for command, callback in admin_commands.items():
+        application.add_handler(CommandHandler(command, callback, filters=admin_only))
+    application.add_handler(CommandHandler(list(admin_commands), _reply_not_authorized))
     application.add_error_handler(_error_handler)
     return application
@@ -95,9 +95,24 @@ document.addEventListener("click", async (e) => {
   }
 });
 
+async function loadJsonInto(el) {
+  const src = el.getAttribute("data-json-src");
+  if (!src) return;
+  try {
+    const resp = await fetch(src, { credentials: "same-origin" });
+    const data = await resp.json();
+    el.textContent = data ? JSON.stringify(data, null, 2) : "-";
+  } catch (err) {
+    el.textContent = `error: ${err}`;
+  }
+}
+
 document.addEventListener("DOMContentLoaded", () => {
   document.querySelectorAll("[data-modal][data-auto-open='1']").forEach((el) => {
     if (el.id) openModalById(el.id);
   });
+  document.querySelectorAll("[data-json-src]").forEach((el) => {
+    loadJsonInto(el);
+  });
 });
 
@@ -3,40 +3,49 @@ from __future__ import annotations
 import asyncio
 import base64
 import binascii
+import functools
 import hashlib
 import json
 import logging
+import os
 import re
 import time
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import UTC, datetime
 from pathlib import Path
 from typing import Any
-from urllib.parse import parse_qsl, quote_plus, unquote, urlencode, urlparse
+from urllib.parse import parse_qsl, quote_plus, unquote, unquote_plus, urlencode, urlparse
 from zoneinfo import ZoneInfo
 
 import httpx
-from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
+from fastapi import Depends, FastAPI, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, MessageEntity
 from telegram.constants import MessageEntityType, ParseMode
+from telegram.request import HTTPXRequest
 
-from .db import AppUser, Database, Panel
-from .formatting import format_bytes, format_dt, parse_epoch_seconds
+from .db import AppUser, Binding, Database, Panel, Schedule, ScheduleConfig, ScheduleMessageState
+from .formatting import format_bytes, format_dt, format_epoch, parse_epoch_seconds, utf16_len
 from .jalali import format_jalali_date, format_jalali_datetime, format_tehran_hour
-from .marzban_client import MarzbanApiError, MarzbanClient, normalize_marzban_base_url
+from .marzban_client import HTTP2_ENABLED, HTTP_LIMITS, MarzbanApiError, MarzbanClient, normalize_marzban_base_url
 from .reports import build_links_document, build_report_message
 from .security import decrypt_text, encrypt_text, hash_password, verify_password
 from .settings import Settings
 from .subscription import resolve_subscription_to_links
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class UserRow:
     username: str
     status: str
@@ -44,11 +53,35 @@ class UserRow:
     data_limit: int | None
     expire_dt: datetime | None
 
+    @classmethod
+    def _from_api(cls, u: dict[str, Any]) -> UserRow:
+        data_limit = u.get("data_limit")
+        if data_limit in (None, 0, "0"):
+            data_limit = None
+        elif type(data_limit) is not int:
+            data_limit = int(data_limit or 0)
+        used = u.get("used_traffic")
+        return cls(
+            username=str(u.get("username", "")),
+            status=str(u.get("status", "")),
+            used_traffic=used if type(used) is int else int(used or 0),
+            data_limit=data_limit,
+            expire_dt=parse_epoch_seconds(u.get("expire")),
+        )
+
 
 def _redirect(url: str) -> RedirectResponse:
     return RedirectResponse(url=url, status_code=303)
 
 
+# Local paths only: a leading "//" would be a protocol-relative redirect to another host.
+_SAFE_NEXT_RE = re.compile(r"/(?!/)[A-Za-z0-9/_\-.~%+@?=&]*")
+
+
+def _safe_next(next_url: str, default: str = "/users") -> str:
+    return next_url if _SAFE_NEXT_RE.fullmatch(next_url or "") else default
+
+
 def _redirect_msg(url: str, msg: str) -> RedirectResponse:
     joiner = "&" if "?" in url else "?"
     return _redirect(f"{url}{joiner}msg={quote_plus(msg)}")
@@ -108,30 +141,37 @@ _LEGACY_SCHEDULE_MESSAGE_TEMPLATES: frozenset[str] = frozenset(
 )
 
 
+_LEGACY_TEMPLATES_MIGRATED_KEY = "schedule_templates_migrated"
+
+
+# First line shared by every legacy template. Newline normalization can't change it, so rows
+# that don't start with it are rejected before allocating a normalized copy.
+_LEGACY_TEMPLATE_PREFIX = os.path.commonprefix(sorted(_LEGACY_SCHEDULE_MESSAGE_TEMPLATES)).split("\n", 1)[0]
+
+
 async def _migrate_legacy_schedule_message_templates(db: Database) -> None:
-    cur = await db.conn.execute(
-        """
-        SELECT panel_id, username
-        FROM schedule_configs
-        WHERE message_template IS NOT NULL
-        """
-    )
-    rows = await cur.fetchall()
-    for row in rows:
-        panel_id = int(row["panel_id"])
-        username = str(row["username"])
-        cfg = await db.get_schedule_config(username=username, panel_id=panel_id)
-        if cfg is None or not cfg.message_template:
-            continue
-        if _normalize_template_text(cfg.message_template) not in _LEGACY_SCHEDULE_MESSAGE_TEMPLATES:
-            continue
-        await db.set_schedule_config(
-            username=username,
-            panel_id=panel_id,
-            message_template=DEFAULT_SCHEDULE_MESSAGE_TEMPLATE,
-            selected_link_keys=cfg.selected_link_keys or None,
-            button_templates=cfg.button_templates or None,
-        )
+    # Legacy templates only come from older releases, so one completed pass is enough.
+    if await db.get_kv(_LEGACY_TEMPLATES_MIGRATED_KEY) == "1":
+        return
+    # One scan on a read-only connection instead of a get_schedule_config per row on the writer.
+    configs = await db.list_templated_schedule_configs()
+    async with db.transaction():
+        for cfg in configs:
+            if not cfg.message_template:
+                continue
+            if not cfg.message_template.lstrip().startswith(_LEGACY_TEMPLATE_PREFIX):
+                continue
+            if _normalize_template_text(cfg.message_template) not in _LEGACY_SCHEDULE_MESSAGE_TEMPLATES:
+                continue
+            await db.set_schedule_config(
+                username=cfg.username,
+                panel_id=cfg.panel_id,
+                message_template=DEFAULT_SCHEDULE_MESSAGE_TEMPLATE,
+                selected_link_keys=cfg.selected_link_keys or None,
+                button_templates=cfg.button_templates or None,
+                keys_migrated=cfg.keys_migrated_at is not None,
+            )
+        await db.set_kv(_LEGACY_TEMPLATES_MIGRATED_KEY, "1")
 
 
 def _describe_panel_login_error(exc: Exception) -> str:
@@ -162,7 +202,9 @@ def _describe_panel_login_error(exc: Exception) -> str:
     return f"Marzban login failed: {_clean_msg(str(exc))}"
 
 
-def _parse_int_set(raw: str) -> set[int]:
+@functools.lru_cache(maxsize=8)
+def _parse_int_set(raw: str) -> frozenset[int]:
+    # Frozen because the cached result is shared; admin_user_ids is parsed on every bot command.
     out: set[int] = set()
     for part in (raw or "").split(","):
         part = part.strip()
@@ -172,7 +214,7 @@ def _parse_int_set(raw: str) -> set[int]:
             out.add(int(part))
         except ValueError:
             continue
-    return out
+    return frozenset(out)
 
 
 def _parse_bool(raw: str | None) -> bool:
@@ -260,15 +302,34 @@ def _parse_interval_minutes(raw: str) -> int | None:
     return total
 
 
-def _render_message_template(template: str, ctx: dict[str, Any]) -> str:
-    def repl(match: re.Match[str]) -> str:
-        key = match.group(1)
-        value = ctx.get(key)
-        if value is None:
-            return ""
-        return str(value)
+@functools.lru_cache(maxsize=256)
+def _compile_template(template: str) -> tuple[tuple[str, str | None], ...]:
+    # Split once into (literal, placeholder) pairs; rendering is then a plain join.
+    segments: list[tuple[str, str | None]] = []
+    pos = 0
+    for match in _TEMPLATE_RE.finditer(template):
+        segments.append((template[pos : match.start()], match.group(1)))
+        pos = match.end()
+    segments.append((template[pos:], None))
+    return tuple(segments)
 
-    return _TEMPLATE_RE.sub(repl, template or "")
+
+@functools.lru_cache(maxsize=256)
+def _template_keys(templates: tuple[str, ...]) -> frozenset[str]:
+    # Placeholders a message and its buttons actually reference, so callers can skip
+    # formatting context values that would never be rendered.
+    return frozenset(key for tpl in templates for _literal, key in _compile_template(tpl) if key is not None)
+
+
+def _render_message_template(template: str, ctx: dict[str, Any]) -> str:
+    parts: list[str] = []
+    for literal, key in _compile_template(template or ""):
+        parts.append(literal)
+        if key is not None:
+            value = ctx.get(key)
+            if value is not None:
+                parts.append(str(value))
+    return "".join(parts)
 
 
 def _chunk_text(text: str, *, max_len: int = 3800) -> list[str]:
@@ -276,38 +337,62 @@ def _chunk_text(text: str, *, max_len: int = 3800) -> list[str]:
     if len(raw) <= max_len:
         return [raw]
 
+    # Cut at the last newline that fits using str.rfind (C-level scan) rather than walking lines;
+    # a single line longer than max_len is hard-split.
     parts: list[str] = []
-    buf = ""
-    for line in raw.splitlines(True):
-        if len(buf) + len(line) > max_len and buf:
-            parts.append(buf.rstrip("\n"))
-            buf = ""
-
-        if len(line) > max_len:
-            remaining = line
-            while len(remaining) > max_len:
-                parts.append(remaining[:max_len])
-                remaining = remaining[max_len:]
-            buf += remaining
-            continue
-
-        buf += line
-
-    if buf:
-        parts.append(buf.rstrip("\n"))
+    start = 0
+    size = len(raw)
+    while size - start > max_len:
+        end = start + max_len
+        cut = raw.rfind("\n", start, end)
+        if cut < 0:
+            parts.append(raw[start:end])
+            start = end
+        else:
+            parts.append(raw[start:cut].rstrip("\n"))
+            start = cut + 1
+    parts.append(raw[start:].rstrip("\n"))
     return [p for p in parts if p.strip()]
 
 
-def _utf16_code_units(text: str) -> int:
-    return len((text or "").encode("utf-16-le")) // 2
+def _strip_basic_markdown(text: str) -> str:
+    # Dropping every backtick also drops ``` fences. str.replace stays on CPython's fast path;
+    # str.translate falls back to a per-char lookup for non-ASCII (Persian) text.
+    return (text or "").replace("`", "").replace("*", "")
+
+
+class _RateLimiter:
+    """Token bucket for outbound Telegram calls, shared by every concurrent sender."""
+
+    def __init__(self, rate: float, *, burst: float | None = None) -> None:
+        self._rate = float(rate)
+        self._capacity = float(burst if burst is not None else rate)
+        self._tokens = self._capacity
+        self._updated: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> None:
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._updated is not None:
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            # Holding the lock while waiting keeps callers in FIFO order.
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+            self._tokens = 0.0
+            self._updated = asyncio.get_running_loop().time()
+
+    async def __aexit__(self, *exc: object) -> None:
+        return None
 
 
-def _strip_basic_markdown(text: str) -> str:
-    raw = text or ""
-    raw = raw.replace("```", "")
-    raw = raw.replace("`", "")
-    raw = raw.replace("*", "")
-    return raw
+# Telegram allows roughly 30 messages per second per bot; concurrent scheduler resets and
+# message expiry would otherwise run into 429s.
+_TELEGRAM_LIMITER = _RateLimiter(30)
+_EXPIRE_CONCURRENCY = 5
 
 
 async def _expire_telegram_messages(
@@ -317,8 +402,9 @@ async def _expire_telegram_messages(
     message_ids: list[int],
     message_texts: list[str],
 ) -> None:
-    for idx, message_id in enumerate(message_ids):
-        src = message_texts[idx] if idx < len(message_texts) else ""
+    sem = asyncio.Semaphore(_EXPIRE_CONCURRENCY)
+
+    async def _expire_one(message_id: int, src: str) -> None:
         plain = _strip_basic_markdown(src).strip()
         if not plain:
             plain = "منقضی شد"
@@ -326,22 +412,35 @@ async def _expire_telegram_messages(
             MessageEntity(
                 type=MessageEntityType.STRIKETHROUGH,
                 offset=0,
-                length=_utf16_code_units(plain),
+                length=utf16_len(plain),
             )
         ]
-        try:
-            await bot.edit_message_text(
-                chat_id=int(chat_id),
-                message_id=int(message_id),
-                text=plain,
-                entities=entities,
-            )
+        # The two edits touch the same message, so they stay sequential.
+        async with sem:
             try:
-                await bot.edit_message_reply_markup(chat_id=int(chat_id), message_id=int(message_id), reply_markup=None)
+                async with _TELEGRAM_LIMITER:
+                    await bot.edit_message_text(
+                        chat_id=int(chat_id),
+                        message_id=int(message_id),
+                        text=plain,
+                        entities=entities,
+                    )
+                try:
+                    async with _TELEGRAM_LIMITER:
+                        await bot.edit_message_reply_markup(
+                            chat_id=int(chat_id), message_id=int(message_id), reply_markup=None
+                        )
+                except Exception:
+                    pass
             except Exception:
                 pass
-        except Exception:
-            pass
+
+    await asyncio.gather(
+        *(
+            _expire_one(message_id, message_texts[idx] if idx < len(message_texts) else "")
+            for idx, message_id in enumerate(message_ids)
+        )
+    )
 
 
 def _compact_one_line(text: str) -> str:
@@ -405,13 +504,15 @@ async def _send_telegram_parts(
 ) -> list[Any]:
     last_idx = max(0, len(parts) - 1)
     out: list[Any] = []
+    # Parts go out one after another so the chat shows them in order.
     for idx, part in enumerate(parts):
-        msg = await bot.send_message(
-            chat_id=chat_id,
-            text=part,
-            parse_mode=parse_mode,
-            reply_markup=(reply_markup if idx == last_idx else None),
-        )
+        async with _TELEGRAM_LIMITER:
+            msg = await bot.send_message(
+                chat_id=chat_id,
+                text=part,
+                parse_mode=parse_mode,
+                reply_markup=(reply_markup if idx == last_idx else None),
+            )
         out.append(msg)
     return out
 
@@ -437,6 +538,7 @@ def _format_links_markdown(links: list[str]) -> str:
     return "\n".join(blocks).rstrip()
 
 
+@functools.lru_cache(maxsize=32)
 def _get_tz(tz_name: str):
     try:
         return ZoneInfo(tz_name)
@@ -452,7 +554,9 @@ def _link_scheme(link: str) -> str:
 
 
 def _fingerprint(text: str) -> str:
-    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:12]
+    # Keys built from this are persisted in schedule_configs.selected_link_keys, so the digest
+    # must stay SHA-256; a faster hash would orphan every saved selection.
+    return hashlib.sha256((text or "").encode()).hexdigest()[:12]
 
 
 def _decode_vmess_json(link: str) -> dict[str, Any] | None:
@@ -521,7 +625,23 @@ _STABLE_URL_QUERY_KEYS: frozenset[str] = frozenset(
 )
 
 
-def _url_label_key_legacy(link: str, scheme: str) -> tuple[str, str, str, str]:
+def _stable_query_items(query: str) -> list[tuple[str, str]]:
+    # Same result as filtering parse_qsl(query, keep_blank_values=True), but only the few
+    # stable keys get percent-decoded; xray URLs carry many params we never look at.
+    items: list[tuple[str, str]] = []
+    for pair in query.split("&"):
+        key, _, value = pair.partition("=")
+        if "%" in key or "+" in key:
+            key = unquote_plus(key)
+        if key not in _STABLE_URL_QUERY_KEYS or not value:
+            continue
+        value = unquote_plus(value)
+        if value.strip():
+            items.append((key, value))
+    return items
+
+
+def _url_label_key_legacy(link: str, scheme: str, *, with_compat: bool = True) -> tuple[str, str, str, str]:
     raw = (link or "").strip()
     try:
         parsed = urlparse(raw)
@@ -541,29 +661,35 @@ def _url_label_key_legacy(link: str, scheme: str) -> tuple[str, str, str, str]:
     port = "" if parsed.port is None else str(int(parsed.port))
     path = parsed.path or ""
 
-    query_items = parse_qsl(parsed.query, keep_blank_values=True)
+    # Stable key (used for persistence): only include low-variance transport params.
+    stable_items = _stable_query_items(parsed.query)
+    stable_query = urlencode(sorted(stable_items), doseq=True)
+    stable_raw = f"{scheme}|{host}|{port}|{path}|{stable_query}|{frag}"
+    key = f"{scheme}:{_fingerprint(stable_raw)}"
+    legacy_key = f"{scheme}:{legacy_label}"
+    if not with_compat:
+        return (label, key, legacy_key, key)
 
     # Back-compat key (includes full query). This can change when subscription payload shuffles
     # parameters (ex: `sni` swapping), so it must NOT be used for selection persistence.
+    query_items = parse_qsl(parsed.query, keep_blank_values=True)
     compat_query = urlencode(sorted(query_items), doseq=True)
     compat_raw = f"{scheme}|{host}|{port}|{path}|{compat_query}|{frag}"
     compat_key = f"{scheme}:{_fingerprint(compat_raw)}"
-
-    # Stable key (used for persistence): only include low-variance transport params.
-    stable_items = [(k, v) for k, v in query_items if k in _STABLE_URL_QUERY_KEYS and str(v).strip() != ""]
-    stable_query = urlencode(sorted(stable_items), doseq=True)
-    stable_raw = f"{scheme}|{host}|{port}|{path}|{stable_query}|{frag}"
-    key = f"{scheme}:{_fingerprint(stable_raw)}"
-    legacy_key = f"{scheme}:{legacy_label}"
     return (label, key, legacy_key, compat_key)
 
 
-def _link_label_key_legacy(link: str) -> tuple[str, str, str, str]:
+# Links are plain strings and the result is an immutable tuple, so one cache here covers the
+# vmess base64/JSON decode and urlparse/parse_qsl work for every repeat of the same link.
+@functools.lru_cache(maxsize=4096)
+def _link_label_key_legacy(link: str, with_compat: bool = True) -> tuple[str, str, str, str]:
+    # Without compat the full-query compat_key (only needed to remap old selections) is
+    # reported as the stable key, skipping a parse_qsl + urlencode + hash per URL link.
     scheme = _link_scheme(link)
     if scheme == "vmess":
         return _vmess_label_key_legacy(link)
     if scheme in {"vless", "trojan", "ss", "socks"}:
-        return _url_label_key_legacy(link, scheme)
+        return _url_label_key_legacy(link, scheme, with_compat=with_compat)
 
     raw = (link or "").strip()
     label = raw[:32] or "link"
@@ -572,17 +698,18 @@ def _link_label_key_legacy(link: str) -> tuple[str, str, str, str]:
     return (label, key, legacy_key, key)
 
 
-def _build_link_items(links: list[str]) -> tuple[dict[str, list[dict[str, str]]], list[dict[str, str]]]:
-    groups: dict[str, list[dict[str, str]]] = {}
-    items: list[dict[str, str]] = []
-    seen: set[str] = set()
-    for link in links:
-        link = (link or "").strip()
-        if not link or link in seen:
-            continue
-        seen.add(link)
+def _build_link_items(
+    links: list[str],
+    *,
+    full: bool = True,
+) -> tuple[dict[str, list[dict[str, Any]]], list[dict[str, Any]]]:
+    # dict.fromkeys dedups while keeping first-seen order.
+    unique = dict.fromkeys(stripped for link in links if (stripped := (link or "").strip()))
+    items: list[dict[str, Any]] = []
+    groups: defaultdict[str, list[dict[str, Any]]] = defaultdict(list)
+    for link in unique:
         scheme = _link_scheme(link)
-        label, key, legacy_key, compat_key = _link_label_key_legacy(link)
+        label, key, legacy_key, compat_key = _link_label_key_legacy(link, full)
         item = {
             "scheme": scheme,
             "label": label,
@@ -590,13 +717,23 @@ def _build_link_items(links: list[str]) -> tuple[dict[str, list[dict[str, str]]]
             "compat_key": compat_key,
             "legacy_key": legacy_key,
             "url": link,
+            # Every key a stored selection may hold for this link, for _select_link_urls.
+            "keys": (key, compat_key, legacy_key),
         }
         items.append(item)
-        groups.setdefault(scheme, []).append(item)
-    return groups, items
+        groups[scheme].append(item)
+    return dict(groups), items
+
 
+def _select_link_urls(links: list[str], link_items: list[dict[str, Any]], selected: set[str]) -> list[str]:
+    # Falls back to every link when nothing is selected or the selection matches no link.
+    if not selected:
+        return links
+    filtered = [it["url"] for it in link_items if not selected.isdisjoint(it["keys"])]
+    return filtered or links
 
-def _migrate_selected_link_keys_to_stable(selected: list[str], link_items: list[dict[str, str]]) -> list[str]:
+
+def _migrate_selected_link_keys_to_stable(selected: list[str], link_items: list[dict[str, Any]]) -> list[str]:
     keys = [str(k).strip() for k in (selected or []) if str(k).strip()]
     if not keys:
         return []
@@ -642,18 +779,8 @@ def _extract_inbound_names(user: dict[str, Any]) -> list[str]:
     raw = user.get("inbounds")
     if not isinstance(raw, dict):
         return []
-    out: list[str] = []
-    seen: set[str] = set()
-    for tags in raw.values():
-        if not isinstance(tags, list):
-            continue
-        for tag in tags:
-            name = str(tag).strip()
-            if not name or name in seen:
-                continue
-            seen.add(name)
-            out.append(name)
-    return out
+    names = (name for tags in raw.values() if isinstance(tags, list) for tag in tags if (name := str(tag).strip()))
+    return list(dict.fromkeys(names))
 
 
 async def _get_db(request: Request) -> Database:
@@ -663,6 +790,21 @@ async def _get_db(request: Request) -> Database:
     return db
 
 
+async def _log_failure(coro: Any, what: str) -> None:
+    try:
+        await coro
+    except Exception:
+        logger.exception("background %s failed", what)
+
+
+def _spawn_background(app: FastAPI, coro: Any, what: str) -> None:
+    # Fire-and-forget write; the set keeps a strong reference and lets shutdown drain it.
+    tasks: set[asyncio.Task] = app.state.bg_tasks
+    task = asyncio.create_task(_log_failure(coro, what))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
 async def _current_user(request: Request) -> AppUser | None:
     user_id = request.session.get("user_id")
     if not user_id:
@@ -689,14 +831,30 @@ async def _get_active_panel(request: Request, user: AppUser) -> Panel | None:
         return None
     active = request.session.get("active_panel_id")
     if active:
-        panel = await db.get_panel(owner_user_id=user.id, panel_id=int(active))
-        if panel is not None:
-            return panel
+        # list_panels is already scoped to the owner, so no second lookup is needed.
+        active_id = int(active)
+        for panel in panels:
+            if panel.id == active_id:
+                return panel
     panel = panels[0]
     request.session["active_panel_id"] = panel.id
     return panel
 
 
+@dataclass(frozen=True, slots=True)
+class OwnerCtx:
+    user: AppUser
+    db: Database
+    panel: Panel | None
+
+
+async def _owner_ctx(request: Request) -> OwnerCtx:
+    """Shared prelude of the per-user routes: signed-in user, database and active panel."""
+    user = await _require_user(request)
+    db = await _get_db(request)
+    return OwnerCtx(user=user, db=db, panel=await _get_active_panel(request, user))
+
+
 async def _get_panel_client_by_app(app: FastAPI, panel: Panel) -> MarzbanClient:
     settings: Settings = app.state.settings
     clients: dict[int, MarzbanClient] = app.state.panel_clients
@@ -733,24 +891,43 @@ async def _invalidate_panel_client(request: Request, panel_id: int) -> None:
     await _invalidate_panel_client_by_app(request.app, panel_id)
 
 
-async def _fetch_subscription_payload_by_app(app: FastAPI, url: str, *, verify_ssl: bool) -> str | None:
+async def _fetch_subscription_payload_by_app(
+    app: FastAPI,
+    url: str,
+    *,
+    verify_ssl: bool,
+    cache: dict[str, str] | None = None,
+) -> str | None:
     url = (url or "").strip()
     if not url:
         return None
-    http: httpx.AsyncClient = app.state.http
+    if cache is not None and url in cache:
+        return cache[url]
+    # httpx fixes TLS verification per client (AsyncClient.get takes no `verify`), so panels
+    # with Verify SSL off use a second shared client; both keep HTTP/2 + keepalive pools warm.
+    http: httpx.AsyncClient = app.state.http if verify_ssl else app.state.http_insecure
     try:
-        resp = await http.get(url, verify=verify_ssl)
+        resp = await http.get(url)
         resp.raise_for_status()
-        return resp.text
+        payload = resp.text
     except Exception:
         return None
+    if cache is not None:
+        cache[url] = payload
+    return payload
 
 
 async def _fetch_subscription_payload(request: Request, url: str, *, verify_ssl: bool) -> str | None:
     return await _fetch_subscription_payload_by_app(request.app, url, verify_ssl=verify_ssl)
 
 
-async def _resolve_links_by_app(app: FastAPI, panel: Panel, user: dict[str, Any]) -> list[str]:
+async def _resolve_links_by_app(
+    app: FastAPI,
+    panel: Panel,
+    user: dict[str, Any],
+    *,
+    payload_cache: dict[str, str] | None = None,
+) -> list[str]:
     links_raw = user.get("links")
     api_links: list[str] = []
     if isinstance(links_raw, list):
@@ -760,6 +937,7 @@ async def _resolve_links_by_app(app: FastAPI, panel: Panel, user: dict[str, Any]
         app,
         str(user.get("subscription_url", "")),
         verify_ssl=panel.verify_ssl,
+        cache=payload_cache,
     )
     if payload:
         resolved = resolve_subscription_to_links(payload)
@@ -768,202 +946,314 @@ async def _resolve_links_by_app(app: FastAPI, panel: Panel, user: dict[str, Any]
     return api_links
 
 
+_LINKS_CACHE_TTL_SECONDS = 30.0
+_LINKS_CACHE_MAX_ENTRIES = 2048
+
+
 async def _resolve_links(request: Request, panel: Panel, user: dict[str, Any]) -> list[str]:
-    return await _resolve_links_by_app(request.app, panel, user)
+    # Page reloads within the TTL reuse the resolved links instead of refetching the subscription.
+    # Entries are keyed per user and only match while the subscription URL is unchanged.
+    cache: dict[tuple[int, str], tuple[float, str, list[str]]] = request.app.state.links_cache
+    key = (panel.id, str(user.get("username") or ""))
+    sub_url = str(user.get("subscription_url") or "").strip()
+    now = time.monotonic()
+    hit = cache.get(key)
+    if hit is not None and hit[1] == sub_url and now - hit[0] < _LINKS_CACHE_TTL_SECONDS:
+        return hit[2]
+    links = await _resolve_links_by_app(request.app, panel, user)
+    if len(cache) >= _LINKS_CACHE_MAX_ENTRIES and key not in cache:
+        cache.pop(next(iter(cache)))
+    cache[key] = (now, sub_url, links)
+    return links
+
+
+def _forget_links(app: FastAPI, panel_id: int, username: str) -> None:
+    # A revoke keeps the subscription URL but rotates what it serves.
+    app.state.links_cache.pop((panel_id, username), None)
+
+
+# PTB's default request pool holds a single connection, which would serialize the scheduler's
+# concurrent sends and admin fan-outs; size it to cover them. getUpdates keeps its own pool.
+_TELEGRAM_POOL_SIZE = 16
+
+
+async def _get_telegram_bot(app: FastAPI, token: str) -> Bot:
+    # One Bot (and its HTTP connection pool) per token, rebuilt only when the token changes.
+    async with app.state.telegram_bot_lock:
+        cached: tuple[str, Bot] | None = app.state.telegram_bot
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        bot = Bot(
+            token=token,
+            request=HTTPXRequest(
+                connection_pool_size=_TELEGRAM_POOL_SIZE,
+                http_version="2" if HTTP2_ENABLED else "1.1",
+            ),
+        )
+        await bot.initialize()
+        app.state.telegram_bot = (token, bot)
+    if cached is not None:
+        try:
+            await cached[1].shutdown()
+        except Exception:
+            logger.exception("failed closing previous telegram bot")
+    return bot
 
 
-async def _scheduler_tick(app: FastAPI) -> None:
+_SCHEDULER_CONCURRENCY = 8
+# Cap per Marzban panel so one tick can't flood a single panel's API.
+_PANEL_CONCURRENCY = 4
+
+
+async def _run_scheduled_reset(
+    app: FastAPI,
+    bot: Bot,
+    sched: Schedule,
+    sched_cfg: ScheduleConfig | None,
+    prev_msg_state: ScheduleMessageState | None,
+    binding: Binding | None,
+    now_epoch: int,
+    payload_cache: dict[str, str],
+    message_states: list[tuple[int, str, int, list[int], list[str]]],
+) -> tuple[int, int, str | None, int, str]:
     db: Database = app.state.db
     settings: Settings = app.state.settings
-    cfg = await db.get_telegram_config()
-    if not cfg.bot_token:
-        return
+    # One clock read per schedule run, refreshed once the revoke has gone through.
+    now_ts = now_epoch
+    try:
+        panel = await db.get_panel_by_id(int(sched.panel_id))
+        if panel is None:
+            return (now_epoch + 3600, now_epoch, "Panel not found", int(sched.panel_id), sched.username)
 
-    bot = Bot(token=cfg.bot_token)
-    now_epoch = int(time.time())
-    due = await db.get_due_schedules(now=now_epoch)
+        chat_id = binding.chat_id if binding else panel.default_chat_id
+        if chat_id is None:
+            return (
+                now_epoch + 300,
+                now_epoch,
+                "No chat_id (set panel default_chat_id or bind user)",
+                panel.id,
+                sched.username,
+            )
 
-    for sched in due:
-        try:
-            panel = await db.get_panel_by_id(int(sched.panel_id))
-            if panel is None:
-                await db.mark_schedule_result(
-                    username=sched.username,
-                    panel_id=int(sched.panel_id),
-                    next_run_at=now_epoch + 3600,
-                    last_run_at=now_epoch,
-                    last_error="Panel not found",
+        client = await _get_panel_client_by_app(app, panel)
+        selected_keys = sched_cfg.selected_link_keys if sched_cfg is not None else []
+        message_template = sched_cfg.message_template if sched_cfg is not None else None
+        button_templates = sched_cfg.button_templates if sched_cfg is not None else None
+
+        # Best-effort migration: if the stored selection used the old (unstable) keying,
+        # rewrite it to the new stable keys before we revoke (since revoke_sub can change
+        # parts of the URL query like `sni`, causing old hashes to stop matching).
+        # Stable keys survive revokes, so this only has to succeed once per config.
+        keys_stable = not selected_keys or sched_cfg is None or sched_cfg.keys_migrated_at is not None
+        if not keys_stable:
+            try:
+                pre_user = await client.get_user(sched.username)
+                pre_links = await _resolve_links_by_app(app, panel, pre_user, payload_cache=payload_cache)
+                _pre_groups, pre_items = _build_link_items(pre_links)
+                migrated = _migrate_selected_link_keys_to_stable(selected_keys, pre_items)
+                if migrated and migrated != selected_keys:
+                    await db.set_schedule_config(
+                        username=sched.username,
+                        panel_id=panel.id,
+                        message_template=message_template,
+                        selected_link_keys=migrated,
+                        button_templates=button_templates,
+                        keys_migrated=True,
+                    )
+                    selected_keys = migrated
+                    keys_stable = True
+                elif migrated:
+                    await db.mark_schedule_keys_migrated(username=sched.username, panel_id=panel.id)
+                    keys_stable = True
+            except Exception:
+                logger.exception(
+                    "failed migrating schedule config keys (username=%s, panel_id=%s)",
+                    sched.username,
+                    panel.id,
                 )
-                continue
 
-            binding = await db.get_binding(username=sched.username, panel_id=panel.id)
-            chat_id = binding.chat_id if binding else panel.default_chat_id
-            if chat_id is None:
-                await db.mark_schedule_result(
-                    username=sched.username,
-                    panel_id=panel.id,
-                    next_run_at=now_epoch + 300,
-                    last_run_at=now_epoch,
-                    last_error="No chat_id (set panel default_chat_id or bind user)",
-                )
-                continue
-            prev_msg_state = await db.get_schedule_message_state(username=sched.username, panel_id=panel.id)
-
-            client = await _get_panel_client_by_app(app, panel)
-            sched_cfg = await db.get_schedule_config(username=sched.username, panel_id=panel.id)
-            selected_keys = sched_cfg.selected_link_keys if sched_cfg is not None else []
-            message_template = sched_cfg.message_template if sched_cfg is not None else None
-            button_templates = sched_cfg.button_templates if sched_cfg is not None else None
-
-            # Best-effort migration: if the stored selection used the old (unstable) keying,
-            # rewrite it to the new stable keys before we revoke (since revoke_sub can change
-            # parts of the URL query like `sni`, causing old hashes to stop matching).
-            if selected_keys:
-                try:
-                    pre_user = await client.get_user(sched.username)
-                    pre_links = await _resolve_links_by_app(app, panel, pre_user)
-                    _pre_groups, pre_items = _build_link_items(pre_links)
-                    migrated = _migrate_selected_link_keys_to_stable(selected_keys, pre_items)
-                    if migrated and migrated != selected_keys:
-                        await db.set_schedule_config(
-                            username=sched.username,
-                            panel_id=panel.id,
-                            message_template=message_template,
-                            selected_link_keys=migrated,
-                            button_templates=button_templates,
-                        )
-                        selected_keys = migrated
-                except Exception:
-                    logger.exception(
-                        "failed migrating schedule config keys (username=%s, panel_id=%s)",
-                        sched.username,
-                        panel.id,
-                    )
+        user = await client.revoke_user_subscription(sched.username)
+        _forget_links(app, panel.id, sched.username)
+        # The revoke rotates what the subscription serves; never reuse a pre-revoke payload.
+        payload_cache.pop(str(user.get("subscription_url") or "").strip(), None)
+        usage = await client.get_user_usage(sched.username)
 
-            user = await client.revoke_user_subscription(sched.username)
-            usage = await client.get_user_usage(sched.username)
-
-            interval_seconds = max(60, int(sched.interval_minutes) * 60)
-            next_run_at = int(time.time()) + interval_seconds
-            now_dt = datetime.now(tz=UTC)
-            next_dt = datetime.fromtimestamp(next_run_at, tz=UTC)
-
-            links_all = await _resolve_links_by_app(app, panel, user)
-            _groups, link_items = _build_link_items(links_all)
-            selected_set = set(selected_keys)
-
-            links_selected = links_all
-            if selected_set:
-                filtered = [
-                    it["url"]
-                    for it in link_items
-                    if it.get("key") in selected_set
-                    or it.get("compat_key") in selected_set
-                    or it.get("legacy_key") in selected_set
-                ]
-                if filtered:
-                    links_selected = filtered
+        interval_seconds = max(60, int(sched.interval_minutes) * 60)
+        now_ts = int(time.time())
+        next_run_at = now_ts + interval_seconds
+        now_dt = datetime.fromtimestamp(now_ts, tz=UTC)
+        next_dt = datetime.fromtimestamp(next_run_at, tz=UTC)
+
+        links_all = await _resolve_links_by_app(app, panel, user, payload_cache=payload_cache)
+        # compat/legacy keys only matter while the selection may still hold pre-stable keys.
+        _groups, link_items = _build_link_items(links_all, full=not keys_stable)
+        selected_set = set(selected_keys)
 
-            inbound_names = _extract_inbound_names(user)
-            inbound_name = ", ".join(inbound_names) if inbound_names else "-"
+        links_selected = _select_link_urls(links_all, link_items, selected_set)
 
-            used = int(user.get("used_traffic") or 0)
-            data_limit_raw = user.get("data_limit")
+        inbound_names = _extract_inbound_names(user)
+        inbound_name = ", ".join(inbound_names) if inbound_names else "-"
+
+        used = int(user.get("used_traffic") or 0)
+        data_limit_raw = user.get("data_limit")
+        data_limit = None
+        try:
+            if data_limit_raw not in (None, "", 0, "0"):
+                data_limit = int(data_limit_raw)
+        except Exception:
             data_limit = None
-            try:
-                if data_limit_raw not in (None, "", 0, "0"):
-                    data_limit = int(data_limit_raw)
-            except Exception:
-                data_limit = None
-            if data_limit is not None and data_limit <= 0:
-                data_limit = None
-            remaining = None if data_limit is None else max(0, int(data_limit) - int(used))
-
-            now_local = now_dt.astimezone(_get_tz(settings.timezone))
-            date_gregorian = now_local.strftime("%Y-%m-%d")
-
-            ctx = {
-                "panel_name": panel.name,
-                "username": str(user.get("username") or sched.username),
-                "inbound_name": inbound_name,
-                "date_jalali": format_jalali_date(now_dt, settings.timezone),
-                "date_gregorian": date_gregorian,
-                "traffic_used_human": format_bytes(used),
-                "traffic_limit_human": format_bytes(data_limit),
-                "traffic_remaining_human": format_bytes(remaining),
-                "next_reset_at": format_tehran_hour(next_dt, "Asia/Tehran"),
-                "next_reset_at_jalali": format_jalali_datetime(next_dt, settings.timezone),
-                "configs": _format_links_markdown(links_selected),
-                "configs_count": len(links_selected),
-                "links": _format_links_markdown(links_selected),
-                "links_count": len(links_selected),
-            }
+        if data_limit is not None and data_limit <= 0:
+            data_limit = None
+        remaining = None if data_limit is None else max(0, int(data_limit) - int(used))
 
-            template = (message_template or DEFAULT_SCHEDULE_MESSAGE_TEMPLATE)
-            message = _render_message_template(template, ctx).strip() or build_report_message(
-                user=user,
-                usage=usage,
-                tz_name=settings.timezone,
-                now=now_dt,
-                next_reset_at=next_dt,
-                interval_hours=None,
-                reason=f"scheduled revoke_sub (panel: {panel.name})",
-            )
+        template = (message_template or DEFAULT_SCHEDULE_MESSAGE_TEMPLATE)
+        needed = _template_keys(
+            (template, *(str(x or "") for x in (button_templates or DEFAULT_SCHEDULE_BUTTON_TEMPLATES)))
+        )
 
-            reply_markup = _build_telegram_info_buttons(button_templates, ctx)
-            parts = _chunk_text(message)
-            sent_messages = await _send_telegram_parts(
-                bot,
-                chat_id=int(chat_id),
-                parts=parts,
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN,
-            )
-            message_ids = [int(getattr(m, "message_id")) for m in sent_messages if getattr(m, "message_id", None) is not None]
-            if message_ids:
-                await db.set_schedule_message_state(
-                    username=sched.username,
-                    panel_id=panel.id,
-                    chat_id=int(chat_id),
-                    message_ids=message_ids,
-                    message_texts=parts,
+        # "configs" and its compat alias "links" share one rendering.
+        links_md = ""
+        if links_selected and ("configs" in needed or "links" in needed):
+            links_md = _format_links_markdown(links_selected)
+
+        ctx = {
+            "panel_name": panel.name,
+            "username": str(user.get("username") or sched.username),
+            "inbound_name": inbound_name,
+            "date_jalali": format_jalali_date(now_dt, settings.timezone) if "date_jalali" in needed else None,
+            "date_gregorian": (
+                now_dt.astimezone(_get_tz(settings.timezone)).strftime("%Y-%m-%d")
+                if "date_gregorian" in needed
+                else None
+            ),
+            "traffic_used_human": format_bytes(used),
+            "traffic_limit_human": format_bytes(data_limit),
+            "traffic_remaining_human": format_bytes(remaining),
+            "next_reset_at": format_tehran_hour(next_dt, "Asia/Tehran") if "next_reset_at" in needed else None,
+            "next_reset_at_jalali": (
+                format_jalali_datetime(next_dt, settings.timezone) if "next_reset_at_jalali" in needed else None
+            ),
+            "configs": links_md,
+            "configs_count": len(links_selected),
+            "links": links_md,
+            "links_count": len(links_selected),
+        }
+
+        message = _render_message_template(template, ctx).strip() or build_report_message(
+            user=user,
+            usage=usage,
+            tz_name=settings.timezone,
+            now=now_dt,
+            next_reset_at=next_dt,
+            interval_hours=None,
+            reason=f"scheduled revoke_sub (panel: {panel.name})",
+        )
+
+        reply_markup = _build_telegram_info_buttons(button_templates, ctx)
+        parts = _chunk_text(message)
+        sent_messages = await _send_telegram_parts(
+            bot,
+            chat_id=int(chat_id),
+            parts=parts,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN,
+        )
+        message_ids = [int(getattr(m, "message_id")) for m in sent_messages if getattr(m, "message_id", None) is not None]
+        if message_ids:
+            message_states.append((panel.id, sched.username, int(chat_id), message_ids, parts))
+            if (
+                prev_msg_state is not None
+                and prev_msg_state.message_ids
+                and (prev_msg_state.chat_id != int(chat_id) or prev_msg_state.message_ids != message_ids)
+            ):
+                await _expire_telegram_messages(
+                    bot,
+                    chat_id=int(prev_msg_state.chat_id),
+                    message_ids=list(prev_msg_state.message_ids),
+                    message_texts=list(prev_msg_state.message_texts),
                 )
-                if (
-                    prev_msg_state is not None
-                    and prev_msg_state.message_ids
-                    and (prev_msg_state.chat_id != int(chat_id) or prev_msg_state.message_ids != message_ids)
-                ):
-                    await _expire_telegram_messages(
-                        bot,
-                        chat_id=int(prev_msg_state.chat_id),
-                        message_ids=list(prev_msg_state.message_ids),
-                        message_texts=list(prev_msg_state.message_texts),
-                    )
 
-            await db.mark_schedule_result(
-                username=sched.username,
-                panel_id=panel.id,
-                next_run_at=next_run_at,
-                last_run_at=int(time.time()),
-                last_error=None,
-            )
-        except Exception as e:
-            await db.mark_schedule_result(
-                username=sched.username,
-                panel_id=int(sched.panel_id),
-                next_run_at=int(time.time()) + 300,
-                last_run_at=int(time.time()),
-                last_error=str(e)[:500],
+        return (next_run_at, now_ts, None, panel.id, sched.username)
+    except Exception as e:
+        return (now_ts + 300, now_ts, str(e)[:500], int(sched.panel_id), sched.username)
+
+
+_SCHEDULER_BATCH_SIZE = 500
+
+
+async def _scheduler_tick(app: FastAPI) -> bool:
+    # Returns True when the batch was full and more schedules may already be due.
+    db: Database = app.state.db
+    cfg = await db.get_telegram_config()
+    if not cfg.bot_token:
+        return False
+
+    now_epoch = int(time.time())
+    due = await db.get_due_schedule_bundles(now=now_epoch, limit=_SCHEDULER_BATCH_SIZE)
+    if not due:
+        return False
+
+    bot = await _get_telegram_bot(app, cfg.bot_token)
+
+    # Each reset is dominated by Marzban/Telegram round-trips; overlap them up to a cap.
+    sem = asyncio.Semaphore(_SCHEDULER_CONCURRENCY)
+    panel_sems: dict[int, asyncio.Semaphore] = app.state.panel_sems
+
+    # Results and sent-message state are written behind, in one commit at the end of the tick.
+    results: list[tuple[int, int, str | None, int, str]] = []
+    message_states: list[tuple[int, str, int, list[int], list[str]]] = []
+    # Subscription payloads fetched during this tick, keyed by URL.
+    payload_cache: dict[str, str] = {}
+
+    async def _guarded(
+        sched: Schedule,
+        sched_cfg: ScheduleConfig | None,
+        prev_msg_state: ScheduleMessageState | None,
+        binding: Binding | None,
+    ) -> None:
+        panel_sem = panel_sems.get(sched.panel_id)
+        if panel_sem is None:
+            panel_sem = panel_sems[sched.panel_id] = asyncio.Semaphore(_PANEL_CONCURRENCY)
+        # Panel slot first, so a busy panel doesn't hold global slots other panels could use.
+        async with panel_sem, sem:
+            results.append(
+                await _run_scheduled_reset(
+                    app, bot, sched, sched_cfg, prev_msg_state, binding, now_epoch, payload_cache, message_states
+                )
             )
 
+    try:
+        await asyncio.gather(*(_guarded(*bundle) for bundle in due))
+    finally:
+        await db.flush_schedule_writes(results, message_states)
+    return len(due) >= _SCHEDULER_BATCH_SIZE
+
 
 async def _scheduler_loop(app: FastAPI) -> None:
     while True:
         try:
-            await _scheduler_tick(app)
+            if await _scheduler_tick(app):
+                continue
         except Exception:
             logger.exception("scheduler tick failed")
-        await asyncio.sleep(max(5, int(app.state.settings.poll_interval_seconds)))
+        try:
+            await app.state.db.sleep_until_next_due(app.state.settings.poll_interval_seconds)
+        except Exception:
+            logger.exception("scheduler sleep failed")
+            await asyncio.sleep(max(5, int(app.state.settings.poll_interval_seconds)))
+
+
+async def _db_maintenance_loop(app: FastAPI) -> None:
+    hours = 0
+    while True:
+        await asyncio.sleep(3600)
+        hours += 1
+        try:
+            await app.state.db.optimize()
+            if hours % 24 == 0:
+                await app.state.db.maintenance()
+        except Exception:
+            logger.exception("db maintenance failed")
 
 
 async def _try_send_telegram_message(app: FastAPI, *, chat_id: int, text: str) -> None:
@@ -972,7 +1262,7 @@ async def _try_send_telegram_message(app: FastAPI, *, chat_id: int, text: str) -
     if not cfg.bot_token:
         return
     try:
-        bot = Bot(token=cfg.bot_token)
+        bot = await _get_telegram_bot(app, cfg.bot_token)
         await _send_telegram_text(bot, chat_id=chat_id, text=text)
     except Exception:
         logger.exception("telegram send_message failed")
@@ -1052,30 +1342,99 @@ async def _telegram_handle_update(*, db: Database, cfg: Any, bot: Bot, update: d
     return True
 
 
-async def _telegram_poll_tick(app: FastAPI) -> int:
+def _telegram_update_chat_id(update: dict[str, Any]) -> int:
+    msg = update.get("message") or (update.get("callback_query") or {}).get("message") or {}
+    chat_id = (msg.get("chat") or {}).get("id")
+    return int(chat_id) if isinstance(chat_id, int) else 0
+
+
+async def _run_telegram_update_after(
+    prev: asyncio.Task | None,
+    *,
+    db: Database,
+    cfg: Any,
+    bot: Bot,
+    update: dict[str, Any],
+) -> None:
+    if prev is not None:
+        await asyncio.wait([prev])
+    try:
+        await _telegram_handle_update(db=db, cfg=cfg, bot=bot, update=update)
+    except Exception:
+        logger.exception("telegram update handling failed")
+
+
+def _dispatch_telegram_update(app: FastAPI, *, db: Database, cfg: Any, bot: Bot, update: dict[str, Any]) -> None:
+    # Handlers run in the background; updates from one chat are chained so they keep their
+    # order, while a slow handler in one chat doesn't hold up the others or the next poll.
+    chains: dict[int, asyncio.Task] = app.state.telegram_chat_tasks
+    chat_id = _telegram_update_chat_id(update)
+    task = asyncio.create_task(
+        _run_telegram_update_after(chains.get(chat_id), db=db, cfg=cfg, bot=bot, update=update)
+    )
+    chains[chat_id] = task
+
+    def _reap(done: asyncio.Task) -> None:
+        if chains.get(chat_id) is done:
+            del chains[chat_id]
+
+    task.add_done_callback(_reap)
+
+
+# Telegram holds getUpdates open up to this long; PTB adds it to the request's read timeout.
+_TELEGRAM_LONG_POLL_SECONDS = 50
+_TELEGRAM_OFFSET_SAVE_EVERY = 20
+
+
+async def _set_polling_enabled(app: FastAPI, enabled: bool) -> None:
+    app.state.tg_poll_enabled = enabled
+    await app.state.db.set_kv("telegram_polling_enabled", "1" if enabled else "0")
+
+
+async def _set_polling_last_error(app: FastAPI, error: str) -> None:
+    # Every successful poll clears the error; only write when it actually changes.
+    if app.state.tg_poll_last_error == error:
+        return
+    app.state.tg_poll_last_error = error
+    await app.state.db.set_kv("telegram_polling_last_error", error)
+
+
+async def _save_polling_offset(app: FastAPI) -> None:
+    offset: int | None = app.state.tg_offset
+    app.state.tg_offset_unsaved = 0
+    await app.state.db.set_kv("telegram_polling_offset", "" if offset is None else str(offset))
+
+
+async def _telegram_poll_tick(
+    app: FastAPI, *, timeout: int = _TELEGRAM_LONG_POLL_SECONDS, wait: bool = True
+) -> int | None:
+    # Returns None when nothing was polled (no token, polling off, getUpdates failed, or
+    # wait=False and another tick holds the lock for its long poll).
     db: Database = app.state.db
     cfg = await db.get_telegram_config()
     if not cfg.bot_token:
-        return 0
+        return None
 
-    enabled = _parse_bool(await db.get_kv("telegram_polling_enabled"))
-    if not enabled:
-        return 0
+    if not app.state.tg_poll_enabled:
+        return None
 
     lock: asyncio.Lock = app.state.telegram_poll_lock
+    if not wait and lock.locked():
+        return None
     async with lock:
-        bot = Bot(token=cfg.bot_token)
-
-        offset_raw = (await db.get_kv("telegram_polling_offset") or "").strip()
-        offset = None
-        if offset_raw and offset_raw.isdigit():
-            offset = int(offset_raw)
+        offset: int | None = app.state.tg_offset
 
         try:
-            updates = await bot.get_updates(offset=offset, timeout=20, allowed_updates=["message", "callback_query"])
+            bot = await _get_telegram_bot(app, cfg.bot_token)
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=timeout,
+                limit=100,
+                allowed_updates=["message", "callback_query"],
+            )
         except Exception as e:
-            await db.set_kv("telegram_polling_last_error", f"{type(e).__name__}: {str(e)[:200]}")
-            return 0
+            await _set_polling_last_error(app, f"{type(e).__name__}: {str(e)[:200]}")
+            return None
 
         processed = 0
         max_update_id: int | None = None
@@ -1083,8 +1442,8 @@ async def _telegram_poll_tick(app: FastAPI) -> int:
         for upd in updates:
             try:
                 update_dict = upd.to_dict() if hasattr(upd, "to_dict") else {}
-                if await _telegram_handle_update(db=db, cfg=cfg, bot=bot, update=update_dict):
-                    processed += 1
+                _dispatch_telegram_update(app, db=db, cfg=cfg, bot=bot, update=update_dict)
+                processed += 1
                 update_id = getattr(upd, "update_id", None)
                 if isinstance(update_id, int):
                     max_update_id = update_id if max_update_id is None else max(max_update_id, update_id)
@@ -1092,10 +1451,14 @@ async def _telegram_poll_tick(app: FastAPI) -> int:
                 logger.exception("telegram update handling failed")
 
         if max_update_id is not None:
-            await db.set_kv("telegram_polling_offset", str(int(max_update_id) + 1))
+            # The offset lives in memory; persist it every few updates and on shutdown only.
+            app.state.tg_offset = int(max_update_id) + 1
+            app.state.tg_offset_unsaved += processed
+            if app.state.tg_offset_unsaved >= _TELEGRAM_OFFSET_SAVE_EVERY:
+                await _save_polling_offset(app)
 
         if processed:
-            await db.set_kv("telegram_polling_last_error", "")
+            await _set_polling_last_error(app, "")
 
         return processed
 
@@ -1109,11 +1472,17 @@ async def _telegram_poll_loop(app: FastAPI) -> None:
             await asyncio.sleep(2)
             continue
 
-        await asyncio.sleep(0.2 if processed else 1.0)
+        # A completed long poll already waited server-side, so re-issue immediately; only back
+        # off when polling is off or getUpdates failed.
+        if processed is None:
+            await asyncio.sleep(1.0)
 
 
 def create_app(settings: Settings) -> FastAPI:
-    app = FastAPI(title="Marzban Bot Panel")
+    app = FastAPI(
+        title="Marzban Bot Panel",
+        default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
+    )
     app.state.settings = settings
     app.add_middleware(SessionMiddleware, secret_key=settings.app_secret_key, same_site="lax")
 
@@ -1121,10 +1490,18 @@ def create_app(settings: Settings) -> FastAPI:
     templates_dir = base_dir / "web" / "templates"
     static_dir = base_dir / "web" / "static"
     templates = Jinja2Templates(directory=str(templates_dir))
+    # Templates ship with the package: compile each once and keep them in the in-memory cache.
+    templates.env.auto_reload = False
     app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
     app.state.panel_clients = {}
     app.state.panel_client_locks = {}
+    app.state.panel_sems = {}
+    app.state.telegram_chat_tasks = {}
+    app.state.bg_tasks = set()
+    app.state.links_cache = {}
+    app.state.telegram_bot = None
+    app.state.telegram_bot_lock = asyncio.Lock()
 
     @app.on_event("startup")
     async def _startup() -> None:
@@ -1133,8 +1510,24 @@ def create_app(settings: Settings) -> FastAPI:
         await _migrate_legacy_schedule_message_templates(db)
         app.state.db = db
 
-        app.state.http = httpx.AsyncClient(timeout=httpx.Timeout(20.0))
+        for path in templates_dir.rglob("*.html"):
+            templates.env.get_template(path.relative_to(templates_dir).as_posix())
+
+        polling_kv = await db.get_kv_many(
+            ["telegram_polling_enabled", "telegram_polling_offset", "telegram_polling_last_error"]
+        )
+        offset_raw = polling_kv.get("telegram_polling_offset", "").strip()
+        app.state.tg_offset = int(offset_raw) if offset_raw.isdigit() else None
+        app.state.tg_offset_unsaved = 0
+        app.state.tg_poll_enabled = _parse_bool(polling_kv.get("telegram_polling_enabled"))
+        app.state.tg_poll_last_error = polling_kv.get("telegram_polling_last_error", "")
+
+        app.state.http = httpx.AsyncClient(timeout=httpx.Timeout(20.0), limits=HTTP_LIMITS, http2=HTTP2_ENABLED)
+        app.state.http_insecure = httpx.AsyncClient(
+            timeout=httpx.Timeout(20.0), limits=HTTP_LIMITS, http2=HTTP2_ENABLED, verify=False
+        )
         app.state.scheduler_task = asyncio.create_task(_scheduler_loop(app))
+        app.state.db_maintenance_task = asyncio.create_task(_db_maintenance_loop(app))
         app.state.telegram_poll_lock = asyncio.Lock()
         app.state.telegram_poll_task = asyncio.create_task(_telegram_poll_loop(app))
 
@@ -1145,19 +1538,34 @@ def create_app(settings: Settings) -> FastAPI:
             task.cancel()
             try:
                 await task
-            except Exception:
+            except (asyncio.CancelledError, Exception):
                 pass
         task = getattr(app.state, "telegram_poll_task", None)
         if isinstance(task, asyncio.Task):
             task.cancel()
             try:
                 await task
-            except Exception:
+            except (asyncio.CancelledError, Exception):
                 pass
+        task = getattr(app.state, "db_maintenance_task", None)
+        if isinstance(task, asyncio.Task):
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+        chat_tasks: dict[int, asyncio.Task] = app.state.telegram_chat_tasks
+        for chat_task in list(chat_tasks.values()):
+            chat_task.cancel()
+        await asyncio.gather(*chat_tasks.values(), return_exceptions=True)
+        # Pending background DB writes must land before the connection closes.
+        await asyncio.gather(*app.state.bg_tasks, return_exceptions=True)
 
-        http = getattr(app.state, "http", None)
-        if isinstance(http, httpx.AsyncClient):
-            await http.aclose()
+        for name in ("http", "http_insecure"):
+            http = getattr(app.state, name, None)
+            if isinstance(http, httpx.AsyncClient):
+                await http.aclose()
 
         clients: dict[int, MarzbanClient] = app.state.panel_clients
         for client in list(clients.values()):
@@ -1167,8 +1575,21 @@ def create_app(settings: Settings) -> FastAPI:
                 pass
         app.state.panel_clients = {}
 
+        cached_bot: tuple[str, Bot] | None = app.state.telegram_bot
+        app.state.telegram_bot = None
+        if cached_bot is not None:
+            try:
+                await cached_bot[1].shutdown()
+            except Exception:
+                pass
+
         db = getattr(app.state, "db", None)
         if isinstance(db, Database):
+            if getattr(app.state, "tg_offset_unsaved", 0):
+                try:
+                    await _save_polling_offset(app)
+                except Exception:
+                    logger.exception("failed to persist telegram polling offset")
             await db.aclose()
 
     @app.get("/", response_class=HTMLResponse)
@@ -1276,6 +1697,8 @@ def create_app(settings: Settings) -> FastAPI:
                 username=admin_username.strip(),
                 password=admin_password,
                 verify_ssl=verify,
+                # One credential check doesn't warrant its own pool and TLS handshake.
+                http_client=request.app.state.http if verify else request.app.state.http_insecure,
             )
         except ValueError:
             return _redirect_msg("/panels", "Invalid base URL. Example: https://domain یا https://domain/marzban")
@@ -1283,8 +1706,6 @@ def create_app(settings: Settings) -> FastAPI:
             await client.login()
         except Exception as e:
             return _redirect_msg("/panels", _describe_panel_login_error(e))
-        finally:
-            await client.aclose()
 
         enc = encrypt_text(settings.app_secret_key, admin_password)
         panel = await db.create_panel(
@@ -1307,9 +1728,7 @@ def create_app(settings: Settings) -> FastAPI:
         if panel is None:
             return _redirect("/panels?msg=Panel+not+found")
         request.session["active_panel_id"] = panel.id
-        if not next.startswith("/"):
-            next = "/users"
-        return _redirect(next)
+        return _redirect(_safe_next(next))
 
     @app.get("/panels/{panel_id}", response_class=HTMLResponse)
     async def panel_edit_get(request: Request, panel_id: int, msg: str = "") -> HTMLResponse:
@@ -1400,21 +1819,20 @@ def create_app(settings: Settings) -> FastAPI:
 
         rows: list[UserRow] = []
         if isinstance(users_raw, list):
-            for u in users_raw:
-                if not isinstance(u, dict):
-                    continue
-                expire_dt = parse_epoch_seconds(u.get("expire"))
-                data_limit = u.get("data_limit")
-                data_limit_int = None if data_limit in (None, 0, "0") else int(data_limit or 0)
-                rows.append(
-                    UserRow(
-                        username=str(u.get("username", "")),
-                        status=str(u.get("status", "")),
-                        used_traffic=int(u.get("used_traffic") or 0),
-                        data_limit=data_limit_int,
-                        expire_dt=expire_dt,
-                    )
-                )
+            from_api = UserRow._from_api
+            rows = [from_api(u) for u in users_raw if isinstance(u, dict)]
+
+        # Format here so the template loop only interpolates strings.
+        tz_name = settings.timezone
+        rows_display = [
+            {
+                "username": r.username,
+                "status": r.status,
+                "traffic": f"{format_bytes(r.used_traffic)} / {format_bytes(r.data_limit)}",
+                "expire": format_dt(r.expire_dt, tz_name),
+            }
+            for r in rows
+        ]
 
         pages = max(1, (total + limit - 1) // limit) if total else 1
         return templates.TemplateResponse(
@@ -1424,15 +1842,12 @@ def create_app(settings: Settings) -> FastAPI:
                 "user": user,
                 "panels": panels,
                 "panel": panel,
-                "rows": rows,
+                "rows": rows_display,
                 "search": search,
                 "page": page,
                 "pages": pages,
                 "total": total,
                 "msg": msg,
-                "format_bytes": format_bytes,
-                "format_dt": format_dt,
-                "tz_name": settings.timezone,
             },
         )
 
@@ -1463,17 +1878,29 @@ def create_app(settings: Settings) -> FastAPI:
         schedule_template = (schedule_cfg.message_template if schedule_cfg is not None else None) or DEFAULT_SCHEDULE_MESSAGE_TEMPLATE
         schedule_selected_keys = schedule_cfg.selected_link_keys if schedule_cfg is not None else []
         schedule_button_templates = (schedule_cfg.button_templates if schedule_cfg is not None else []) or DEFAULT_SCHEDULE_BUTTON_TEMPLATES
-        if schedule_cfg is not None and schedule_selected_keys:
+        if schedule_cfg is not None and schedule_selected_keys and schedule_cfg.keys_migrated_at is None:
             migrated = _migrate_selected_link_keys_to_stable(schedule_selected_keys, link_items)
+            # Idempotent, so persist it off the page load; the page renders the migrated keys either way.
             if migrated and migrated != schedule_selected_keys:
-                await db.set_schedule_config(
-                    username=username,
-                    panel_id=panel.id,
-                    message_template=schedule_cfg.message_template,
-                    selected_link_keys=migrated,
-                    button_templates=schedule_cfg.button_templates,
+                _spawn_background(
+                    request.app,
+                    db.set_schedule_config(
+                        username=username,
+                        panel_id=panel.id,
+                        message_template=schedule_cfg.message_template,
+                        selected_link_keys=migrated,
+                        button_templates=schedule_cfg.button_templates,
+                        keys_migrated=True,
+                    ),
+                    "schedule key migration",
                 )
                 schedule_selected_keys = migrated
+            elif migrated:
+                _spawn_background(
+                    request.app,
+                    db.mark_schedule_keys_migrated(username=username, panel_id=panel.id),
+                    "schedule key migration",
+                )
 
         next_reset_dt = None
         if schedule and schedule.enabled:
@@ -1509,10 +1936,8 @@ def create_app(settings: Settings) -> FastAPI:
         )
 
     @app.get("/users/{username}/links.txt")
-    async def user_links_txt(request: Request, username: str) -> PlainTextResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+    async def user_links_txt(request: Request, username: str, ctx: OwnerCtx = Depends(_owner_ctx)) -> PlainTextResponse:
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             raise HTTPException(status_code=400, detail="No panel selected")
 
@@ -1542,32 +1967,34 @@ def create_app(settings: Settings) -> FastAPI:
         return PlainTextResponse(content, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
     @app.post("/users/{username}/revoke")
-    async def user_revoke(request: Request, username: str) -> RedirectResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+    async def user_revoke(request: Request, username: str, ctx: OwnerCtx = Depends(_owner_ctx)) -> RedirectResponse:
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
 
         client = await _get_panel_client(request, panel)
         await client.revoke_user_subscription(username)
+        _forget_links(request.app, panel.id, username)
 
         sched = await db.get_schedule(username=username, panel_id=panel.id)
         if sched and sched.enabled:
-            next_run = int(time.time()) + int(sched.interval_minutes) * 60
+            now_ts = int(time.time())
             await db.mark_schedule_result(
                 username=username,
                 panel_id=panel.id,
-                next_run_at=next_run,
-                last_run_at=int(time.time()),
+                next_run_at=now_ts + int(sched.interval_minutes) * 60,
+                last_run_at=now_ts,
                 last_error=None,
             )
         return _redirect(f"/users/{username}?msg=revoke_sub+done")
 
     @app.post("/users/{username}/reset-usage")
-    async def user_reset_usage(request: Request, username: str) -> RedirectResponse:
-        user = await _require_user(request)
-        panel = await _get_active_panel(request, user)
+    async def user_reset_usage(
+        request: Request,
+        username: str,
+        ctx: OwnerCtx = Depends(_owner_ctx),
+    ) -> RedirectResponse:
+        panel = ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
 
@@ -1576,10 +2003,13 @@ def create_app(settings: Settings) -> FastAPI:
         return _redirect(f"/users/{username}?msg=usage+reset+done")
 
     @app.post("/users/{username}/schedule")
-    async def user_schedule(request: Request, username: str, interval: str = Form(...)) -> RedirectResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+    async def user_schedule(
+        request: Request,
+        username: str,
+        interval: str = Form(...),
+        ctx: OwnerCtx = Depends(_owner_ctx),
+    ) -> RedirectResponse:
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
 
@@ -1612,10 +2042,13 @@ def create_app(settings: Settings) -> FastAPI:
         return _redirect_msg(f"/users/{username}?open_cfg=1", f"scheduled {_format_interval_minutes(int(interval_minutes))}")
 
     @app.post("/users/{username}/unschedule")
-    async def user_unschedule(request: Request, username: str, open_cfg: int = 0) -> RedirectResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+    async def user_unschedule(
+        request: Request,
+        username: str,
+        open_cfg: int = 0,
+        ctx: OwnerCtx = Depends(_owner_ctx),
+    ) -> RedirectResponse:
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
         await db.disable_schedule(username=username, panel_id=panel.id)
@@ -1631,25 +2064,16 @@ def create_app(settings: Settings) -> FastAPI:
         message_template: str = Form(""),
         link_keys: list[str] = Form([]),
         button_templates: list[str] = Form([]),
+        ctx: OwnerCtx = Depends(_owner_ctx),
     ) -> RedirectResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
 
         template = (message_template or "").strip() or None
-        keys = [str(k).strip() for k in (link_keys or []) if str(k).strip()]
-        unique_keys: list[str] = []
-        seen: set[str] = set()
-        for k in keys:
-            if k in seen:
-                continue
-            seen.add(k)
-            unique_keys.append(k)
+        unique_keys = list(dict.fromkeys(k for k in (str(x).strip() for x in link_keys or []) if k))
 
-        raw_buttons = [str(x or "") for x in (button_templates or [])]
-        button_tpls = [x.strip() for x in raw_buttons[:3]] if raw_buttons else None
+        button_tpls = [str(x or "").strip() for x in (button_templates or [])[:3]] or None
 
         await db.set_schedule_config(
             username=username,
@@ -1657,6 +2081,8 @@ def create_app(settings: Settings) -> FastAPI:
             message_template=template,
             selected_link_keys=unique_keys or None,
             button_templates=button_tpls,
+            # The form posts each link's stable key.
+            keys_migrated=True,
         )
         return _redirect_msg(f"/users/{username}", "Schedule config saved")
 
@@ -1667,10 +2093,9 @@ def create_app(settings: Settings) -> FastAPI:
         message_template: str = Form(""),
         link_keys: list[str] = Form([]),
         button_templates: list[str] = Form([]),
+        ctx: OwnerCtx = Depends(_owner_ctx),
     ) -> RedirectResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
 
@@ -1683,31 +2108,27 @@ def create_app(settings: Settings) -> FastAPI:
             return _redirect_msg(f"/users/{username}?open_cfg=1", "Set Telegram admin user IDs first")
 
         client = await _get_panel_client(request, panel)
-        api_user = await client.get_user(username)
-        usage = await client.get_user_usage(username)
-        schedule = await db.get_schedule(username=username, panel_id=panel.id)
+
+        async def _user_and_links() -> tuple[dict[str, Any], list[str]]:
+            api_user = await client.get_user(username)
+            return api_user, await _resolve_links(request, panel, api_user)
+
+        # The usage call and the schedule read overlap the user fetch + subscription resolve.
+        (api_user, links_all), usage, schedule = await asyncio.gather(
+            _user_and_links(),
+            client.get_user_usage(username),
+            db.get_schedule(username=username, panel_id=panel.id),
+        )
 
         now_dt = datetime.now(tz=UTC)
         next_dt = None
         if schedule and schedule.enabled:
             next_dt = datetime.fromtimestamp(int(schedule.next_run_at), tz=UTC)
 
-        links_all = await _resolve_links(request, panel, api_user)
         _groups, link_items = _build_link_items(links_all)
 
-        keys = [str(k).strip() for k in (link_keys or []) if str(k).strip()]
-        selected_set = set(keys)
-        links_selected = links_all
-        if selected_set:
-            filtered = [
-                it["url"]
-                for it in link_items
-                if it.get("key") in selected_set
-                or it.get("compat_key") in selected_set
-                or it.get("legacy_key") in selected_set
-            ]
-            if filtered:
-                links_selected = filtered
+        selected_set = {k for k in (str(x).strip() for x in link_keys or []) if k}
+        links_selected = _select_link_urls(links_all, link_items, selected_set)
 
         inbound_names = _extract_inbound_names(api_user)
         inbound_name = ", ".join(inbound_names) if inbound_names else "-"
@@ -1724,27 +2145,40 @@ def create_app(settings: Settings) -> FastAPI:
             data_limit = None
         remaining = None if data_limit is None else max(0, int(data_limit) - int(used))
 
-        now_local = now_dt.astimezone(_get_tz(settings.timezone))
-        date_gregorian = now_local.strftime("%Y-%m-%d")
+        template = (message_template or "").strip() or DEFAULT_SCHEDULE_MESSAGE_TEMPLATE
+        button_tpls = [str(x or "").strip() for x in (button_templates or [])[:3]] or None
+        needed = _template_keys((template, *(button_tpls or DEFAULT_SCHEDULE_BUTTON_TEMPLATES)))
+
+        # "configs" and its compat alias "links" share one rendering.
+        links_md = ""
+        if links_selected and ("configs" in needed or "links" in needed):
+            links_md = _format_links_markdown(links_selected)
 
         ctx = {
             "panel_name": panel.name,
             "username": str(api_user.get("username") or username),
             "inbound_name": inbound_name,
-            "date_jalali": format_jalali_date(now_dt, settings.timezone),
-            "date_gregorian": date_gregorian,
+            "date_jalali": format_jalali_date(now_dt, settings.timezone) if "date_jalali" in needed else None,
+            "date_gregorian": (
+                now_dt.astimezone(_get_tz(settings.timezone)).strftime("%Y-%m-%d")
+                if "date_gregorian" in needed
+                else None
+            ),
             "traffic_used_human": format_bytes(used),
             "traffic_limit_human": format_bytes(data_limit),
             "traffic_remaining_human": format_bytes(remaining),
-            "next_reset_at": format_tehran_hour(next_dt, "Asia/Tehran"),
-            "next_reset_at_jalali": format_jalali_datetime(next_dt, settings.timezone) if next_dt is not None else "-",
-            "configs": _format_links_markdown(links_selected),
+            "next_reset_at": format_tehran_hour(next_dt, "Asia/Tehran") if "next_reset_at" in needed else None,
+            "next_reset_at_jalali": (
+                format_jalali_datetime(next_dt, settings.timezone)
+                if next_dt is not None and "next_reset_at_jalali" in needed
+                else "-"
+            ),
+            "configs": links_md,
             "configs_count": len(links_selected),
-            "links": _format_links_markdown(links_selected),
+            "links": links_md,
             "links_count": len(links_selected),
         }
 
-        template = (message_template or "").strip() or DEFAULT_SCHEDULE_MESSAGE_TEMPLATE
         message = _render_message_template(template, ctx).strip()
         if not message:
             message = build_report_message(
@@ -1758,20 +2192,23 @@ def create_app(settings: Settings) -> FastAPI:
             )
         message = "🧪 TEST پیام (preview)\n\n" + message
 
-        raw_buttons = [str(x or "") for x in (button_templates or [])]
-        button_tpls = [x.strip() for x in raw_buttons[:3]] if raw_buttons else None
         reply_markup = _build_telegram_info_buttons(button_tpls, ctx)
 
-        bot = Bot(token=telegram_cfg.bot_token)
-        sent = 0
+        bot = await _get_telegram_bot(request.app, telegram_cfg.bot_token)
+        # Admin sends overlap; _TELEGRAM_LIMITER inside the send path keeps them under the rate cap.
+        results = await asyncio.gather(
+            *(
+                _send_telegram_text(bot, chat_id=int(chat_id), text=message, reply_markup=reply_markup)
+                for chat_id in admins
+            ),
+            return_exceptions=True,
+        )
         failed = 0
-        for chat_id in admins:
-            try:
-                await _send_telegram_text(bot, chat_id=int(chat_id), text=message, reply_markup=reply_markup)
-                sent += 1
-            except Exception:
+        for chat_id, result in zip(admins, results):
+            if isinstance(result, Exception):
                 failed += 1
-                logger.exception("telegram test send failed (chat_id=%s)", chat_id)
+                logger.error("telegram test send failed (chat_id=%s)", chat_id, exc_info=result)
+        sent = len(results) - failed
 
         return _redirect_msg(
             f"/users/{username}?open_cfg=1",
@@ -1779,20 +2216,21 @@ def create_app(settings: Settings) -> FastAPI:
         )
 
     @app.post("/users/{username}/bind")
-    async def user_bind(request: Request, username: str, chat_id: int = Form(...)) -> RedirectResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+    async def user_bind(
+        request: Request,
+        username: str,
+        chat_id: int = Form(...),
+        ctx: OwnerCtx = Depends(_owner_ctx),
+    ) -> RedirectResponse:
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
         await db.upsert_binding(username=username, panel_id=panel.id, chat_id=int(chat_id), user_id=None)
         return _redirect(f"/users/{username}?msg=binding+saved")
 
     @app.post("/users/{username}/unbind")
-    async def user_unbind(request: Request, username: str) -> RedirectResponse:
-        user = await _require_user(request)
-        db = await _get_db(request)
-        panel = await _get_active_panel(request, user)
+    async def user_unbind(request: Request, username: str, ctx: OwnerCtx = Depends(_owner_ctx)) -> RedirectResponse:
+        db, panel = ctx.db, ctx.panel
         if panel is None:
             return _redirect("/panels?msg=Add+a+panel+first")
         await db.delete_binding(username=username, panel_id=panel.id)
@@ -1806,10 +2244,17 @@ def create_app(settings: Settings) -> FastAPI:
         items = await db.list_schedules_for_owner(owner_user_id=user.id, limit=200)
         panel_map = {p.id: p for p in panels}
 
-        def epoch_to_dt(value: int | None) -> datetime | None:
-            if value is None:
-                return None
-            return datetime.fromtimestamp(int(value), tz=UTC)
+        # Format per-row strings here (format_epoch is memoized) rather than calling back from the template loop.
+        tz_name = settings.timezone
+        rows = [
+            (
+                s,
+                _format_interval_minutes(s.interval_minutes),
+                format_epoch(s.next_run_at, tz_name),
+                format_epoch(s.last_run_at, tz_name) if s.last_run_at else "-",
+            )
+            for s in items
+        ]
 
         return templates.TemplateResponse(
             request=request,
@@ -1817,12 +2262,8 @@ def create_app(settings: Settings) -> FastAPI:
             context={
                 "user": user,
                 "panels": panels,
-                "items": items,
+                "rows": rows,
                 "panel_map": panel_map,
-                "epoch_to_dt": epoch_to_dt,
-                "format_dt": format_dt,
-                "format_interval": _format_interval_minutes,
-                "tz_name": settings.timezone,
                 "msg": msg,
             },
         )
@@ -1832,24 +2273,16 @@ def create_app(settings: Settings) -> FastAPI:
         user = await _require_user(request)
         db = await _get_db(request)
         cfg = await db.get_telegram_config()
-        polling_enabled = _parse_bool(await db.get_kv("telegram_polling_enabled"))
-        polling_offset = (await db.get_kv("telegram_polling_offset") or "").strip()
-        polling_last_error = (await db.get_kv("telegram_polling_last_error") or "").strip()
-        info = None
-        if cfg.bot_token:
-            try:
-                bot = Bot(token=cfg.bot_token)
-                webhook_info = await bot.get_webhook_info()
-                info = webhook_info.to_dict() if hasattr(webhook_info, "to_dict") else str(webhook_info)
-            except Exception as e:
-                info = {"error": f"{type(e).__name__}: {str(e)}"}
+        polling_enabled = request.app.state.tg_poll_enabled
+        polling_offset = "" if request.app.state.tg_offset is None else str(request.app.state.tg_offset)
+        polling_last_error = request.app.state.tg_poll_last_error.strip()
+        # Webhook info is a Telegram round-trip; the page loads it from /telegram/webhook-info.
         return templates.TemplateResponse(
             request=request,
             name="telegram.html",
             context={
                 "user": user,
                 "cfg": cfg,
-                "info": info,
                 "polling_enabled": polling_enabled,
                 "polling_offset": polling_offset,
                 "polling_last_error": polling_last_error,
@@ -1858,6 +2291,20 @@ def create_app(settings: Settings) -> FastAPI:
             },
         )
 
+    @app.get("/telegram/webhook-info")
+    async def telegram_webhook_info(request: Request) -> Any:
+        await _require_user(request)
+        db = await _get_db(request)
+        cfg = await db.get_telegram_config()
+        if not cfg.bot_token:
+            return None
+        try:
+            bot = await _get_telegram_bot(request.app, cfg.bot_token)
+            webhook_info = await bot.get_webhook_info()
+            return webhook_info.to_dict() if hasattr(webhook_info, "to_dict") else str(webhook_info)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {str(e)}"}
+
     @app.post("/telegram/save")
     async def telegram_save(
         request: Request,
@@ -1883,9 +2330,9 @@ def create_app(settings: Settings) -> FastAPI:
             return _redirect("/telegram?msg=Set+bot+token+first")
         if not cfg.webhook_url:
             return _redirect("/telegram?msg=Set+webhook_url+first")
-        bot = Bot(token=cfg.bot_token)
+        bot = await _get_telegram_bot(request.app, cfg.bot_token)
         await bot.set_webhook(url=cfg.webhook_url)
-        await db.set_kv("telegram_polling_enabled", "0")
+        await _set_polling_enabled(request.app, False)
         return _redirect("/telegram?msg=Webhook+set")
 
     @app.post("/telegram/delete-webhook")
@@ -1895,7 +2342,7 @@ def create_app(settings: Settings) -> FastAPI:
         cfg = await db.get_telegram_config()
         if not cfg.bot_token:
             return _redirect("/telegram?msg=Set+bot+token+first")
-        bot = Bot(token=cfg.bot_token)
+        bot = await _get_telegram_bot(request.app, cfg.bot_token)
         await bot.delete_webhook()
         return _redirect("/telegram?msg=Webhook+deleted")
 
@@ -1906,28 +2353,36 @@ def create_app(settings: Settings) -> FastAPI:
         cfg = await db.get_telegram_config()
         if not cfg.bot_token:
             return _redirect_msg("/telegram", "Set bot token first")
-        bot = Bot(token=cfg.bot_token)
+        bot = await _get_telegram_bot(request.app, cfg.bot_token)
         try:
             await bot.delete_webhook(drop_pending_updates=True)
         except Exception:
             pass
-        await db.set_kv("telegram_polling_enabled", "1")
-        await db.set_kv("telegram_polling_offset", "")
-        await db.set_kv("telegram_polling_last_error", "")
+        # Reset offset and last error and turn polling on in one commit.
+        state = request.app.state
+        state.tg_offset = None
+        state.tg_offset_unsaved = 0
+        state.tg_poll_last_error = ""
+        state.tg_poll_enabled = True
+        await db.set_kv_many(
+            {"telegram_polling_enabled": "1", "telegram_polling_offset": "", "telegram_polling_last_error": ""}
+        )
         return _redirect_msg("/telegram", "Polling enabled (no webhook). Send /whoami to your bot.")
 
     @app.post("/telegram/polling/disable")
     async def telegram_polling_disable(request: Request) -> RedirectResponse:
         await _require_user(request)
-        db = await _get_db(request)
-        await db.set_kv("telegram_polling_enabled", "0")
+        await _set_polling_enabled(request.app, False)
         return _redirect_msg("/telegram", "Polling disabled")
 
     @app.post("/telegram/polling/poll-now")
     async def telegram_polling_poll_now(request: Request) -> RedirectResponse:
         await _require_user(request)
-        processed = await _telegram_poll_tick(request.app)
-        return _redirect_msg("/telegram", f"Polled updates: {processed}")
+        # The background poller holds the lock for up to a full long poll; don't queue behind it.
+        processed = await _telegram_poll_tick(request.app, timeout=0, wait=False)
+        if processed is None and request.app.state.telegram_poll_lock.locked():
+            return _redirect_msg("/telegram", "Poller busy (long poll in progress); updates are being received")
+        return _redirect_msg("/telegram", f"Polled updates: {processed or 0}")
 
     @app.post("/telegram/webhook")
     async def telegram_webhook(request: Request) -> dict[str, Any]:
@@ -1936,9 +2391,11 @@ def create_app(settings: Settings) -> FastAPI:
         if not cfg.bot_token:
             return {"ok": False, "error": "bot_token not configured"}
 
-        update = await request.json()
-        bot = Bot(token=cfg.bot_token)
-        await _telegram_handle_update(db=db, cfg=cfg, bot=bot, update=update)
+        body = await request.body()
+        update = orjson.loads(body) if orjson is not None else json.loads(body)
+        bot = await _get_telegram_bot(request.app, cfg.bot_token)
+        # ACK right away so Telegram doesn't retry on slow handlers; per-chat order is kept.
+        _dispatch_telegram_update(request.app, db=db, cfg=cfg, bot=bot, update=update)
         return {"ok": True}
 
     @app.exception_handler(MarzbanApiError)